@@ -1,17 +1,64 @@
+import array
 import contextlib
 import heapq
 import pickle as pkl
+import shutil
+import threading
 from pathlib import Path
 
-from tqdm import tqdm
-
 from BSBI.inverted_index import (
     InvertedIndexIterator,
     InvertedIndexMapper,
     InvertedIndexWriter,
 )
 
-from .utils import IdMap, sorted_intersect
+from .lexicon import WILDCARD, TermLexicon
+from .pair_cache import PairCache, index_fingerprint, mine_frequent_pairs
+from .stats import IndexStats
+from .utils import (
+    IdMap,
+    MappedIdMap,
+    intersect_arrays,
+    intersect_postings,
+    union_arrays,
+    union_postings,
+)
+
+
+def _merge_term_range(
+    part_name: str,
+    directory: Path,
+    index_ids: list[str],
+    postings_encoding,
+    term_ids: list[int],
+) -> str:
+    """Merges the postings of `term_ids` from every intermediate index into
+    the part index `part_name`. `term_ids` must already be sorted by term.
+
+    Runs in a worker process of `BSBIIndex.parallel_merge`.
+    """
+    with contextlib.ExitStack() as stack:
+        indices = [
+            stack.enter_context(
+                InvertedIndexMapper(
+                    index_id,
+                    directory=directory,
+                    postings_encoding=postings_encoding,
+                )
+            )
+            for index_id in index_ids
+        ]
+        with InvertedIndexWriter(
+            part_name, directory=directory, postings_encoding=postings_encoding
+        ) as part:
+            for term_id in term_ids:
+                all_postings = [
+                    index[term_id]
+                    for index in indices
+                    if term_id in index.postings_dict
+                ]
+                part.append(term_id, list(heapq.merge(*all_postings)))
+    return part_name
 
 
 class BSBIIndex:
@@ -26,41 +73,128 @@ class BSBIIndex:
     index_name(str): Name assigned to index
     postings_encoding: Encoding used for storing the postings.
         The default (None) implies UncompressedPostings
+    lazy_load(bool): If True, `retrieve` only loads term_id_map up front and
+        memory-maps the doc map the first time a query has results
+    use_arrays(bool): If True, `retrieve` decodes postings into NumPy arrays
+        and intersects them with vectorized kernels. Requires NumPy.
+    lexicon(TermLexicon): Sorted terms used to expand wildcard query terms.
+        Built by `save` and loaded on the first wildcard query
+    pair_cache(PairCache): Precomputed intersections of frequent term pairs,
+        see `build_pair_cache`. Loaded on the first query
+    doc_scores(array): Static score of each docID, written by `build_tiers`.
+        Loaded on the first `retrieve_top_k`
+    tier_fingerprint(tuple): Fingerprint of the main index the first tier
+        and `doc_scores` were built from
+    stats(IndexStats): Cumulative reader counters of every query, None
+        unless enabled with `enable_stats`
+    last_query_stats(IndexStats): Reader counters of the last query
     """
 
-    def __init__(self, data_dir, output_dir, index_name="BSBI", postings_encoding=None):
+    def __init__(
+        self,
+        data_dir,
+        output_dir,
+        index_name="BSBI",
+        postings_encoding=None,
+        lazy_load=False,
+        use_arrays=False,
+    ):
         self.term_id_map = IdMap()
         self.doc_id_map = IdMap()
         self.data_dir = Path(data_dir)
         self.output_dir = Path(output_dir)
         self.index_name = index_name
         self.postings_encoding = postings_encoding
+        self.lazy_load = lazy_load
+        self.use_arrays = use_arrays
+        self.lexicon = None
+        self.pair_cache = None
+        self.doc_scores = None
+        self.tier_fingerprint = None
+        self.stats = None
+        self.last_query_stats = None
+        self.stats_hook = None
+        # Serializes stats updates of queries run concurrently, e.g. by
+        # `AsyncSearcher`
+        self._stats_lock = threading.Lock()
 
         # Stores names of intermediate indices
         self.intermediate_indices = []
 
     def save(self):
-        """Dumps doc_id_map and term_id_map into output directory"""
+        """Dumps doc_id_map and term_id_map into output directory.
+
+        The doc map is also written as a memory-mappable `docs.paths` file
+        used by `load_docs` when lazy loading.
+        """
         with open((self.output_dir / "terms.dict"), "wb") as f:
             pkl.dump(self.term_id_map, f)
         with open((self.output_dir / "docs.dict"), "wb") as f:
             pkl.dump(self.doc_id_map, f)
+        MappedIdMap.write(self.output_dir / "docs.paths", self.doc_id_map.id_to_str)
+        self.lexicon = TermLexicon.from_id_map(self.term_id_map)
+        with open((self.output_dir / "terms.lexicon"), "wb") as f:
+            pkl.dump(self.lexicon, f)
 
     def load(self):
         """Loads doc_id_map and term_id_map from output directory"""
+        self.load_terms()
+        self.load_docs()
 
+    def load_terms(self):
+        """Loads term_id_map from output directory"""
         with open((self.output_dir / "terms.dict"), "rb") as f:
             self.term_id_map = pkl.load(f)
+
+    def load_lexicon(self):
+        """Loads the sorted term lexicon from output directory"""
+        with open((self.output_dir / "terms.lexicon"), "rb") as f:
+            self.lexicon = pkl.load(f)
+
+    def load_scores(self):
+        """Loads the static document scores from output directory, with the
+        fingerprint of the main index the first tier was built from"""
+        with open((self.output_dir / f"{self.index_name}.tier1.meta"), "rb") as f:
+            self.tier_fingerprint = pkl.load(f)
+        self.doc_scores = array.array("d")
+        with open((self.output_dir / "docs.scores"), "rb") as f:
+            self.doc_scores.frombytes(f.read())
+
+    def load_docs(self):
+        """Loads doc_id_map from output directory.
+
+        In lazy mode the doc map is memory-mapped from `docs.paths` when
+        available, instead of unpickling the whole `docs.dict`.
+        """
+        paths_file = self.output_dir / "docs.paths"
+        if self.lazy_load and paths_file.exists():
+            self.doc_id_map = MappedIdMap(paths_file)
+            return
         with open((self.output_dir / "docs.dict"), "rb") as f:
             self.doc_id_map = pkl.load(f)
 
-    def index(self):
+    def index(self, merge_workers: int = 1, tier_size=None, static_score=None):
         """Base indexing code
 
         This function loops through the data directories,
         calls parse_block to parse the documents
         calls invert_write, which inverts each block and writes to a new index
         then saves the id maps and calls merge on the intermediate indices
+
+        Parameters
+        ----------
+        merge_workers: int
+            Number of processes used to merge the intermediate indices.
+            With more than one worker `parallel_merge` is used instead of
+            `merge`.
+        tier_size: int
+            If given, `build_tiers` writes a first tier index holding the
+            `tier_size` highest scoring postings of each term, used by
+            `retrieve_top_k`
+        static_score: Callable[[str], float]
+            Static (query independent) score of a document given its relative
+            path. Required when `tier_size` is given. Without `tier_size`, the
+            first tier of a previous index is removed
         """
         dirs = [obj for obj in self.data_dir.iterdir() if obj.is_dir()]
         for block_dir_relative in sorted(dirs):
@@ -75,6 +209,28 @@ class BSBIIndex:
                 self.invert_write(td_pairs, index)
                 td_pairs = None
         self.save()
+        if merge_workers > 1:
+            self.parallel_merge(merge_workers)
+        else:
+            self.serial_merge()
+        if tier_size is not None:
+            if static_score is None:
+                raise ValueError("static_score is required to build tiers")
+            scores = [static_score(path) for path in self.doc_id_map.id_to_str]
+            self.build_tiers(scores, tier_size)
+        else:
+            self.remove_tiers()
+
+        # Recompute the cached intersections against the new index
+        pair_cache = PairCache(self.index_name, self.output_dir, self.postings_encoding)
+        if pair_cache.exists():
+            pair_cache.load()
+            pair_cache.build(
+                pair_cache.pairs, self.term_id_map, pair_cache.budget_bytes
+            )
+
+    def serial_merge(self):
+        """Merges all the intermediate indices into the final index with `merge`"""
         with InvertedIndexWriter(
             self.index_name,
             directory=self.output_dir,
@@ -109,15 +265,24 @@ class BSBIIndex:
         Should use self.term_id_map and self.doc_id_map to get termIDs and docIDs.
         These persist across calls to parse_block
         """
+        from tqdm import tqdm
+
         pair_collection = []
         for file in tqdm(sorted(block_dir.iterdir())):
             file_str = file.relative_to(block_dir.parent)
             doc_id = self.doc_id_map[str(file_str)]
-            terms = set(file.read_text().split())
-            pairs = [(self.term_id_map[term], doc_id) for term in terms]
-            pair_collection.extend(pairs)
+            term_ids = self.parse_document(file.read_text().split())
+            pair_collection.extend((term_id, doc_id) for term_id in term_ids)
         return pair_collection
 
+    def parse_document(self, tokens: list[str]) -> set[int]:
+        """Maps the tokens of a document to its set of termIDs
+
+        Called by `parse_block` for every document, in order. Subclasses can
+        extend it to collect other statistics in the same pass over the corpus
+        """
+        return {self.term_id_map[term] for term in set(tokens)}
+
     def invert_write(self, td_pairs: tuple[int, int], index: InvertedIndexWriter):
         """Inverts td_pairs into postings_lists and writes them to the given index"""
 
@@ -188,13 +353,215 @@ class BSBIIndex:
                     except StopIteration:
                         pass  # Iterator exhausted
 
+    def parallel_merge(self, workers: int):
+        """Merges the intermediate indices using `workers` processes
+
+        The term space is split into `workers` disjoint ranges of consecutive
+        terms (in term order) holding roughly the same number of postings.
+        Each range is merged by its own process into a part index, and the
+        parts are then concatenated into the final index, shifting the start
+        positions of their postings lists.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        postings_per_term = {}
+        for index_id in self.intermediate_indices:
+            with open(self.output_dir / f"{index_id}.dict", "rb") as f:
+                postings_dict, _ = pkl.load(f)
+            for term_id, (_, n_postings, _) in postings_dict.items():
+                postings_per_term[term_id] = (
+                    postings_per_term.get(term_id, 0) + n_postings
+                )
+        term_ids = sorted(postings_per_term, key=lambda t: self.term_id_map[t])
+
+        # Split term_ids into contiguous ranges with similar numbers of postings
+        total = sum(postings_per_term.values())
+        ranges, current, accumulated = [], [], 0
+        for term_id in term_ids:
+            current.append(term_id)
+            accumulated += postings_per_term[term_id]
+            if accumulated >= total * (len(ranges) + 1) / workers:
+                ranges.append(current)
+                current = []
+        if current:
+            ranges.append(current)
+
+        part_names = [f"{self.index_name}.part{i}" for i in range(len(ranges))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(
+                executor.map(
+                    _merge_term_range,
+                    part_names,
+                    [self.output_dir] * len(ranges),
+                    [self.intermediate_indices] * len(ranges),
+                    [self.postings_encoding] * len(ranges),
+                    ranges,
+                )
+            )
+
+        postings_dict, terms = {}, []
+        with open(self.output_dir / f"{self.index_name}.index", "wb") as merged:
+            for part_name in part_names:
+                part_index = self.output_dir / f"{part_name}.index"
+                part_metadata = self.output_dir / f"{part_name}.dict"
+                offset = merged.tell()
+                with open(part_index, "rb") as part:
+                    shutil.copyfileobj(part, merged)
+                with open(part_metadata, "rb") as f:
+                    part_postings_dict, part_terms = pkl.load(f)
+                for term_id in part_terms:
+                    start, n_postings, n_bytes = part_postings_dict[term_id]
+                    postings_dict[term_id] = (start + offset, n_postings, n_bytes)
+                terms.extend(part_terms)
+                part_index.unlink()
+                part_metadata.unlink()
+        with open(self.output_dir / f"{self.index_name}.dict", "wb") as f:
+            pkl.dump([postings_dict, terms], f)
+
+    def build_tiers(self, scores: list[float], tier_size: int):
+        """Writes the first tier of an impact-ordered tiered index
+
+        For every term of the merged index, the `tier_size` postings with the
+        highest static `scores` are written (in docID order) to the
+        `<index_name>.tier1` index. The merged index itself acts as the lower
+        tier. The scores are saved to `docs.scores` for ranking at query time,
+        and the fingerprint of the merged index to `<index_name>.tier1.meta`
+        so `retrieve_top_k` can detect a first tier that is out of date.
+        """
+        scores = array.array("d", scores)
+        with open((self.output_dir / "docs.scores"), "wb") as f:
+            f.write(scores.tobytes())
+        self.doc_scores = scores
+
+        with (
+            InvertedIndexIterator(
+                self.index_name,
+                directory=self.output_dir,
+                postings_encoding=self.postings_encoding,
+            ) as index,
+            InvertedIndexWriter(
+                f"{self.index_name}.tier1",
+                directory=self.output_dir,
+                postings_encoding=self.postings_encoding,
+            ) as tier_index,
+        ):
+            for term_id, postings in index:
+                if len(postings) > tier_size:
+                    top = heapq.nlargest(tier_size, postings, key=scores.__getitem__)
+                    postings = sorted(top)
+                tier_index.append(term_id, postings)
+
+        self.tier_fingerprint = index_fingerprint(self.index_name, self.output_dir)
+        with open((self.output_dir / f"{self.index_name}.tier1.meta"), "wb") as f:
+            pkl.dump(self.tier_fingerprint, f)
+
+    def remove_tiers(self):
+        """Deletes the first tier and the static document scores, if any"""
+        for name in (
+            f"{self.index_name}.tier1.index",
+            f"{self.index_name}.tier1.dict",
+            f"{self.index_name}.tier1.meta",
+            "docs.scores",
+        ):
+            (self.output_dir / name).unlink(missing_ok=True)
+        self.doc_scores = None
+        self.tier_fingerprint = None
+
+    def build_pair_cache(
+        self, queries, budget_bytes: int = 1 << 20, min_count: int = 2
+    ) -> PairCache:
+        """Precomputes the intersections of the term pairs that co-occur most
+        often in a query log
+
+        Parameters
+        ----------
+        queries: Iterable[str]
+            Logged queries, e.g. an open query log file
+        budget_bytes: int
+            Maximum size of the encoded cached postings lists
+        min_count: int
+            Minimum number of queries a pair must appear in to be cached
+
+        The cache is rebuilt for the same pairs each time `index` runs, and is
+        ignored by `retrieve` if the main index changed since it was built.
+        """
+        if len(self.term_id_map) == 0:
+            self.load_terms()
+        pairs = mine_frequent_pairs(queries, min_count)
+        pair_cache = PairCache(self.index_name, self.output_dir, self.postings_encoding)
+        pair_cache.build(pairs, self.term_id_map, budget_bytes)
+        self.pair_cache = pair_cache
+        return pair_cache
+
+    def enable_stats(self, hook=None):
+        """Starts recording the index reads of each query
+
+        Parameters
+        ----------
+        hook: Callable[[str, IndexStats], None]
+            Optional callback invoked after each query with the query and its
+            stats
+
+        Queries may run concurrently in threads, as with `AsyncSearcher`: the
+        stats of each query are accumulated under a lock, and the hook is
+        called under the same lock, one query at a time.
+        """
+        with self._stats_lock:
+            self.stats = IndexStats()
+            self.stats_hook = hook
+
+    def disable_stats(self):
+        with self._stats_lock:
+            self.stats = None
+            self.last_query_stats = None
+            self.stats_hook = None
+
+    def _get_pair_cache(self) -> PairCache | None:
+        """Returns the pair cache if there is an up to date one"""
+        if self.pair_cache is None:
+            self.pair_cache = PairCache(
+                self.index_name, self.output_dir, self.postings_encoding
+            )
+            if self.pair_cache.exists():
+                self.pair_cache.load()
+        if self.pair_cache.fingerprint is None or not self.pair_cache.is_fresh():
+            return None
+        return self.pair_cache
+
+    def _get_doc_scores(self) -> array.array:
+        """Returns the static document scores, if the first tier was built
+        from the current main index"""
+        fingerprint = index_fingerprint(self.index_name, self.output_dir)
+        if self.doc_scores is None or self.tier_fingerprint != fingerprint:
+            if not (self.output_dir / f"{self.index_name}.tier1.meta").exists():
+                raise ValueError(
+                    "No first tier for retrieve_top_k, index with tier_size"
+                )
+            self.load_scores()
+        if self.tier_fingerprint != fingerprint:
+            raise ValueError(
+                "The first tier is out of date, index again with tier_size"
+            )
+        return self.doc_scores
+
+    def _get_wildcard_postings(self, index: InvertedIndexMapper, pattern: str):
+        """Unions the postings lists of every term matching `pattern`"""
+        if self.lexicon is None:
+            self.load_lexicon()
+        term_ids = self.lexicon.expand(pattern)
+        if self.use_arrays:
+            return union_arrays([index.get_postings_array(t) for t in term_ids])
+        return union_postings([index[t] for t in term_ids])
+
     def retrieve(self, query: str) -> list[str]:
         """Retrieves the documents corresponding to the conjunctive query
 
         Parameters
         ----------
         query: str
-            Space separated list of query tokens
+            Space separated list of query tokens. Tokens containing `*` are
+            wildcards, matching the union of the documents of every term
+            they expand to
 
         Result
         ------
@@ -204,29 +571,109 @@ class BSBIIndex:
 
         Should NOT throw errors for terms not in corpus
         """
-        if len(self.term_id_map) == 0 or len(self.doc_id_map) == 0:
+        result = self._retrieve_doc_ids(query, self.index_name)
+        if len(result) == 0:
+            return []
+        if len(self.doc_id_map) == 0:
+            self.load_docs()
+        return [self.doc_id_map[doc_id] for doc_id in result]
+
+    def retrieve_top_k(self, query: str, k: int = 10) -> list[str]:
+        """Retrieves the `k` documents with the highest static score among the
+        documents matching the conjunctive query
+
+        The first tier written by `build_tiers` is evaluated first. The full
+        postings lists are only read when the first tier has fewer than `k`
+        matches. As with any tiered index, the result is approximate: a
+        document that is in a lower tier for some query term is only found
+        when the first tier does not produce `k` results.
+
+        Raises a ValueError if there is no first tier, or if the main index
+        changed since it was built.
+
+        Result
+        ------
+        List[str]
+            Up to `k` documents, by decreasing static score
+        """
+        doc_scores = self._get_doc_scores()
+
+        result = self._retrieve_doc_ids(query, f"{self.index_name}.tier1")
+        if len(result) < k:
+            result = self._retrieve_doc_ids(query, self.index_name)
+        if len(result) == 0:
+            return []
+        top = heapq.nlargest(k, result, key=doc_scores.__getitem__)
+        if len(self.doc_id_map) == 0:
+            self.load_docs()
+        return [self.doc_id_map[doc_id] for doc_id in top]
+
+    def _retrieve_doc_ids(self, query: str, index_name: str) -> list[int]:
+        """Returns the sorted docIDs matching the conjunctive `query` in the
+        index `index_name`"""
+        if self.lazy_load:
+            if len(self.term_id_map) == 0:
+                self.load_terms()
+        elif len(self.term_id_map) == 0 or len(self.doc_id_map) == 0:
             self.load()
 
         query_terms = query.split()
         if not query_terms:
             return []
 
+        query_stats = IndexStats() if self.stats is not None else None
         postings_lists = []
+        wildcards = [term for term in query_terms if WILDCARD in term]
+        term_ids = [self.term_id_map[t] for t in query_terms if WILDCARD not in t]
+
+        pair_cache = self._get_pair_cache() if index_name == self.index_name else None
+        if pair_cache is not None and len(term_ids) > 1:
+            # Start from the cached intersections covering pairs of query terms
+            with InvertedIndexMapper(
+                pair_cache.name,
+                postings_encoding=self.postings_encoding,
+                directory=self.output_dir,
+                stats=query_stats,
+            ) as cache:
+                keys, term_ids = pair_cache.plan(term_ids, cache)
+                for key in keys:
+                    if self.use_arrays:
+                        postings_lists.append(cache.get_postings_array(key))
+                    else:
+                        postings_lists.append(cache[key])
 
         with InvertedIndexMapper(
-            self.index_name,
+            index_name,
             postings_encoding=self.postings_encoding,
             directory=self.output_dir,
+            stats=query_stats,
         ) as index:
-            for term in query_terms:
-                term_id = self.term_id_map[term]
-                postings = index[term_id]
+            for term_id in term_ids:
+                if self.use_arrays:
+                    postings = index.get_postings_array(term_id)
+                else:
+                    postings = index[term_id]
                 postings_lists.append(postings)
+            for term in wildcards:
+                postings_lists.append(self._get_wildcard_postings(index, term))
+        if query_stats is not None:
+            with self._stats_lock:
+                if self.stats is not None:
+                    self.stats.add(query_stats)
+                    self.last_query_stats = query_stats
+                    if self.stats_hook is not None:
+                        self.stats_hook(query, query_stats)
         if not postings_lists:
             return []
 
+        # Intersect the shortest lists first to keep intermediate results small
+        postings_lists.sort(key=len)
+        intersect = intersect_arrays if self.use_arrays else intersect_postings
         result = postings_lists[0]
         for postings in postings_lists[1:]:
-            result = sorted_intersect(result, postings)
+            result = intersect(result, postings)
 
-        return [self.doc_id_map[doc_id] for doc_id in result]
+        if self.use_arrays:
+            # Only convert back to Python ints when mapping to doc paths
+            return result.tolist()
+        return result
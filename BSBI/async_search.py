@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from .BSBI import BSBIIndex
+
+
+class AsyncSearcher:
+    """Asyncio front-end for `BSBIIndex.retrieve`.
+
+    Queries run in a thread pool so that postings reads and intersections do
+    not block the event loop. At most `max_concurrency` queries run at once,
+    and concurrent requests for the same query share a single computation.
+    Stats enabled with `BSBIIndex.enable_stats` are recorded per query, and
+    `last_query_stats` is whichever query finished last.
+
+    Attributes
+    ----------
+    index(BSBIIndex): Index answering the queries
+    timeout(float): Default per-query timeout in seconds, None for no timeout
+    """
+
+    def __init__(
+        self, index: BSBIIndex, max_concurrency: int = 8, timeout: float | None = None
+    ):
+        self.index = index
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._load_lock = asyncio.Lock()
+        # Maps each running query to its task and number of waiters
+        self._inflight = {}
+
+    async def _ensure_loaded(self):
+        """Loads the id maps once, before queries run concurrently"""
+        async with self._load_lock:
+            if len(self.index.term_id_map) == 0:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self._executor, self.index.load)
+
+    async def _run(self, query: str) -> list[str]:
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, self.index.retrieve, query
+            )
+
+    async def aretrieve(self, query: str, timeout: float | None = None) -> list[str]:
+        """Retrieves the documents matching the conjunctive `query`
+
+        Raises `TimeoutError` if the query does not complete within `timeout`
+        (or the searcher default). Cancelling or timing out only stops
+        waiting; the shared computation is cancelled once no caller waits
+        for it anymore and it has not started running.
+        """
+        await self._ensure_loaded()
+        query = " ".join(query.split())
+        entry = self._inflight.get(query)
+        if entry is None or entry[0].cancelled() or entry[0].cancelling():
+            task = asyncio.ensure_future(self._run(query))
+            entry = [task, 0]
+            task.add_done_callback(lambda _, entry=entry: self._forget(query, entry))
+            self._inflight[query] = entry
+        entry[1] += 1
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(entry[0]),
+                timeout if timeout is not None else self.timeout,
+            )
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                entry[0].cancel()
+                self._forget(query, entry)
+
+    def _forget(self, query: str, entry: list):
+        """Removes `entry` from the running queries, unless it was already
+        replaced by a newer computation of `query`"""
+        if self._inflight.get(query) is entry:
+            del self._inflight[query]
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _handle_http(searcher: AsyncSearcher, reader, writer):
+    """Answers `GET /search?q=<query>` with a JSON list of documents"""
+    try:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        # Skip the request headers
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+
+        status, body = 404, {"error": "not found"}
+        if len(request_line) >= 2 and request_line[0] == "GET":
+            url = urlsplit(request_line[1])
+            if url.path == "/search":
+                query = parse_qs(url.query).get("q", [""])[0]
+                try:
+                    results = await searcher.aretrieve(query)
+                    status, body = 200, {"query": query, "results": results}
+                except TimeoutError:
+                    status, body = 504, {"error": "query timed out"}
+
+        payload = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode()
+            + payload
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(searcher: AsyncSearcher, host: str = "127.0.0.1", port: int = 8080):
+    """Serves `searcher` over HTTP until cancelled"""
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_http(searcher, reader, writer), host, port
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON search endpoint")
+    parser.add_argument("output_dir", help="Directory containing the BSBI index")
+    parser.add_argument("--index-name", default="BSBI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=None)
+    args = parser.parse_args()
+
+    index = BSBIIndex(
+        data_dir=args.output_dir, output_dir=args.output_dir, index_name=args.index_name
+    )
+
+    async def run():
+        searcher = AsyncSearcher(index, args.max_concurrency, args.timeout)
+        try:
+            await serve(searcher, args.host, args.port)
+        finally:
+            searcher.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import array
+import struct
+
+# Number of low bits handled by a single container. Every docID is split into
+# a 16-bit key (high bits) selecting the container and a 16-bit value (low bits)
+# stored inside it.
+CONTAINER_BITS = 16
+CONTAINER_SIZE = 1 << CONTAINER_BITS
+# Array containers with more values than this take more space than a bitmap
+BITMAP_BYTES = CONTAINER_SIZE // 8
+ARRAY_MAX_CARDINALITY = BITMAP_BYTES // 2
+
+ARRAY_CONTAINER = 0
+BITMAP_CONTAINER = 1
+
+# Positions of the set bits for every possible byte value
+_BYTE_BITS = [tuple(i for i in range(8) if b >> i & 1) for b in range(256)]
+
+_HEADER = struct.Struct("<I")
+_CONTAINER_HEADER = struct.Struct("<HBI")
+
+
+def _bitmap_to_array(bits: bytes) -> array.array:
+    """Converts a bitmap container into a sorted array container"""
+    values = array.array("H")
+    for byte_idx, byte in enumerate(bits):
+        if byte:
+            base = byte_idx << 3
+            values.extend(base + bit for bit in _BYTE_BITS[byte])
+    return values
+
+
+def _array_to_bitmap(values) -> bytes:
+    """Converts sorted low bits into a bitmap container"""
+    bits = bytearray(BITMAP_BYTES)
+    for v in values:
+        bits[v >> 3] |= 1 << (v & 7)
+    return bytes(bits)
+
+
+def _bitmap_cardinality(bits: bytes) -> int:
+    return int.from_bytes(bits, "little").bit_count()
+
+
+def _intersect_arrays(values1, values2) -> array.array:
+    result = array.array("H")
+    i, j = 0, 0
+    len1, len2 = len(values1), len(values2)
+    while i < len1 and j < len2:
+        if values1[i] == values2[j]:
+            result.append(values1[i])
+            i += 1
+            j += 1
+        elif values1[i] < values2[j]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+class RoaringBitmap:
+    """Compressed bitmap of docIDs using roaring-style containers.
+
+    The docID space is partitioned in chunks of 2^16 ids. Each non-empty chunk
+    is stored in a container which is either a sorted array of the low 16 bits
+    (sparse chunks) or a 2^16-bit bitmap (dense chunks). Intersecting two
+    bitmap containers is a single word-level AND.
+
+    Attributes
+    ----------
+    containers: Dict[int, Tuple[int, array.array | bytes]]
+        Maps the high 16 bits of a docID to a (container_type, data) pair.
+        Keys are kept in ascending order.
+    """
+
+    def __init__(self, containers: dict | None = None):
+        self.containers = containers if containers is not None else {}
+
+    @classmethod
+    def from_list(cls, postings_list: list[int]) -> "RoaringBitmap":
+        """Builds a bitmap from an ascending sorted list of docIDs"""
+        grouped = {}
+        for doc_id in postings_list:
+            key = doc_id >> CONTAINER_BITS
+            grouped.setdefault(key, array.array("H")).append(doc_id & 0xFFFF)
+
+        containers = {}
+        for key, values in grouped.items():
+            if len(values) > ARRAY_MAX_CARDINALITY:
+                containers[key] = (BITMAP_CONTAINER, _array_to_bitmap(values))
+            else:
+                containers[key] = (ARRAY_CONTAINER, values)
+        return cls(containers)
+
+    def __len__(self) -> int:
+        total = 0
+        for kind, data in self.containers.values():
+            if kind == BITMAP_CONTAINER:
+                total += _bitmap_cardinality(data)
+            else:
+                total += len(data)
+        return total
+
+    def __iter__(self):
+        for key, (kind, data) in self.containers.items():
+            base = key << CONTAINER_BITS
+            if kind == BITMAP_CONTAINER:
+                data = _bitmap_to_array(data)
+            for v in data:
+                yield base + v
+
+    def __contains__(self, doc_id: int) -> bool:
+        try:
+            kind, data = self.containers[doc_id >> CONTAINER_BITS]
+        except KeyError:
+            return False
+        low = doc_id & 0xFFFF
+        if kind == BITMAP_CONTAINER:
+            return bool(data[low >> 3] >> (low & 7) & 1)
+        # Binary search on the sorted array container
+        lo, hi = 0, len(data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if data[mid] < low:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < len(data) and data[lo] == low
+
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        """Intersects two bitmaps container by container"""
+        containers = {}
+        for key, (kind1, data1) in self.containers.items():
+            try:
+                kind2, data2 = other.containers[key]
+            except KeyError:
+                continue
+
+            if kind1 == BITMAP_CONTAINER and kind2 == BITMAP_CONTAINER:
+                bits = int.from_bytes(data1, "little") & int.from_bytes(
+                    data2, "little"
+                )
+                cardinality = bits.bit_count()
+                if cardinality == 0:
+                    continue
+                data = bits.to_bytes(BITMAP_BYTES, "little")
+                if cardinality > ARRAY_MAX_CARDINALITY:
+                    containers[key] = (BITMAP_CONTAINER, data)
+                else:
+                    containers[key] = (ARRAY_CONTAINER, _bitmap_to_array(data))
+                continue
+
+            if kind1 == ARRAY_CONTAINER and kind2 == ARRAY_CONTAINER:
+                values = _intersect_arrays(data1, data2)
+            else:
+                values, bits = (
+                    (data1, data2) if kind1 == ARRAY_CONTAINER else (data2, data1)
+                )
+                values = array.array(
+                    "H", (v for v in values if bits[v >> 3] >> (v & 7) & 1)
+                )
+            if values:
+                containers[key] = (ARRAY_CONTAINER, values)
+        return RoaringBitmap(containers)
+
+    def intersect_list(self, postings_list: list[int]) -> list[int]:
+        """Intersects the bitmap with an ascending sorted list of docIDs.
+
+        Each posting of the list is probed against the bitmap, so the cost is
+        proportional to the length of the list and not to the bitmap.
+        """
+        return [doc_id for doc_id in postings_list if doc_id in self]
+
+    def tolist(self) -> list[int]:
+        return list(self)
+
+    def to_array(self):
+        """Returns the docIDs as a sorted uint64 NumPy array"""
+        import numpy as np
+
+        chunks = []
+        for key, (kind, data) in self.containers.items():
+            base = np.uint64(key << CONTAINER_BITS)
+            if kind == BITMAP_CONTAINER:
+                bits = np.unpackbits(
+                    np.frombuffer(data, dtype=np.uint8), bitorder="little"
+                )
+                chunks.append(np.flatnonzero(bits).astype(np.uint64) + base)
+            else:
+                chunks.append(np.frombuffer(data, dtype=np.uint16) + base)
+        if not chunks:
+            return np.empty(0, dtype=np.uint64)
+        return np.concatenate(chunks)
+
+    def to_bytes(self) -> bytes:
+        """Serializes the bitmap as
+        [n_containers] + [key, type, cardinality, data] * n_containers
+        """
+        chunks = [_HEADER.pack(len(self.containers))]
+        for key, (kind, data) in self.containers.items():
+            if kind == BITMAP_CONTAINER:
+                cardinality = _bitmap_cardinality(data)
+                payload = data
+            else:
+                cardinality = len(data)
+                payload = data.tobytes()
+            chunks.append(_CONTAINER_HEADER.pack(key, kind, cardinality))
+            chunks.append(payload)
+        return b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, encoded: bytes) -> "RoaringBitmap":
+        """Deserializes a bitmap produced by `RoaringBitmap.to_bytes`"""
+        (n_containers,) = _HEADER.unpack_from(encoded, 0)
+        offset = _HEADER.size
+        containers = {}
+        for _ in range(n_containers):
+            key, kind, cardinality = _CONTAINER_HEADER.unpack_from(encoded, offset)
+            offset += _CONTAINER_HEADER.size
+            if kind == BITMAP_CONTAINER:
+                containers[key] = (
+                    BITMAP_CONTAINER,
+                    bytes(encoded[offset : offset + BITMAP_BYTES]),
+                )
+                offset += BITMAP_BYTES
+            else:
+                values = array.array("H")
+                values.frombytes(encoded[offset : offset + 2 * cardinality])
+                containers[key] = (ARRAY_CONTAINER, values)
+                offset += 2 * cardinality
+        return cls(containers)
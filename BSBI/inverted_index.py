@@ -1,7 +1,9 @@
 import pickle as pkl
+import time
 from pathlib import Path
 
 from .postings import UncompressedPostings
+from .stats import IndexStats
 
 
 class InvertedIndex:
@@ -34,7 +36,11 @@ class InvertedIndex:
     """
 
     def __init__(
-        self, index_name: str, postings_encoding=None, directory: str | Path = ""
+        self,
+        index_name: str,
+        postings_encoding=None,
+        directory: str | Path = "",
+        stats: IndexStats | None = None,
     ):
         """
         Parameters
@@ -44,6 +50,8 @@ class InvertedIndex:
             decoding lists of integers. Default is None, which gets replaced
             with UncompressedPostings
         directory (str): Directory where the index files will be stored
+        stats (IndexStats): If given, readers record their seeks, reads,
+            decoding and lookups in it
         """
         dir = Path(directory)
 
@@ -55,6 +63,7 @@ class InvertedIndex:
         else:
             self.postings_encoding = postings_encoding
         self.directory = directory
+        self.stats = stats
 
         self.postings_dict = {}
         self.terms = []  # Need to keep track of the order in which the
@@ -153,6 +162,8 @@ class InvertedIndexIterator(InvertedIndex):
             term = next(self.term_iter)
             start, _, byte_len = self.postings_dict[term]
 
+            if self.stats is not None:
+                return (term, self._read_instrumented(start, byte_len))
             self.index_file.seek(start)
             byte_postings = self.index_file.read(byte_len)
             postings_list = list(self.postings_encoding.decode(byte_postings))
@@ -160,6 +171,18 @@ class InvertedIndexIterator(InvertedIndex):
         except StopIteration:
             raise StopIteration("No more terms in the index.")
 
+    def _read_instrumented(self, start: int, byte_len: int) -> list[int]:
+        self.stats.lookups += 1
+        self.stats.seeks += 1
+        self.index_file.seek(start)
+        byte_postings = self.index_file.read(byte_len)
+        self.stats.bytes_read += len(byte_postings)
+        decode_start = time.perf_counter()
+        postings_list = list(self.postings_encoding.decode(byte_postings))
+        self.stats.decode_time += time.perf_counter() - decode_start
+        self.stats.postings_decoded += len(postings_list)
+        return postings_list
+
     def delete_from_disk(self):
         """Marks the index for deletion upon exit. Useful for temporary indices"""
         self.delete_upon_exit = True
@@ -177,6 +200,12 @@ class InvertedIndexIterator(InvertedIndex):
 
 
 class InvertedIndexMapper(InvertedIndex):
+    def __exit__(self, exception_type, exception_value, traceback):
+        """Closes the index_file. The metadata is only read by the mapper, so
+        it is not written back, which allows several processes to map the same
+        index at once"""
+        self.index_file.close()
+
     def __getitem__(self, key):
         return self._get_postings_list(key)
 
@@ -187,6 +216,8 @@ class InvertedIndexMapper(InvertedIndex):
         I.e., it should only have to read the bytes from the index file
         corresponding to the postings list for the requested term.
         """
+        if self.stats is not None:
+            return self._read_instrumented(term, self.postings_encoding.decode, [])
         try:
             start, ndocs, nbytes = self.postings_dict[term]
         except KeyError:
@@ -196,3 +227,46 @@ class InvertedIndexMapper(InvertedIndex):
         postings_bt = self.index_file.read(nbytes)
         postings = self.postings_encoding.decode(postings_bt)
         return postings
+
+    def _read_instrumented(self, term, decode, missing):
+        """Reads and decodes the postings of `term` with `decode` while
+        recording the work done in `self.stats`"""
+        self.stats.lookups += 1
+        try:
+            start, ndocs, nbytes = self.postings_dict[term]
+        except KeyError:
+            self.stats.misses += 1
+            return missing
+
+        self.stats.seeks += 1
+        self.index_file.seek(start)
+        postings_bt = self.index_file.read(nbytes)
+        self.stats.bytes_read += len(postings_bt)
+        decode_start = time.perf_counter()
+        postings = decode(postings_bt)
+        self.stats.decode_time += time.perf_counter() - decode_start
+        self.stats.postings_decoded += ndocs
+        return postings
+
+    def get_postings_array(self, term: int):
+        """Gets the postings list for `term` as a NumPy array of docIDs.
+
+        Uses the `decode_array` method of the postings encoding, which
+        decodes straight into an array instead of a list of Python ints.
+        """
+        import numpy as np
+
+        if self.stats is not None:
+            return self._read_instrumented(
+                term,
+                self.postings_encoding.decode_array,
+                np.empty(0, dtype=np.uint64),
+            )
+        try:
+            start, ndocs, nbytes = self.postings_dict[term]
+        except KeyError:
+            return np.empty(0, dtype=np.uint64)
+
+        self.index_file.seek(start)
+        postings_bt = self.index_file.read(nbytes)
+        return self.postings_encoding.decode_array(postings_bt)
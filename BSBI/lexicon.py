@@ -0,0 +1,98 @@
+import re
+from bisect import bisect_left
+
+from .utils import IdMap, sorted_intersect
+
+# Marks the beginning and end of a term in its k-grams
+BOUNDARY = "$"
+WILDCARD = "*"
+# Sorts after any character that can appear in a term
+_MAX_CHAR = chr(0x10FFFF)
+
+
+class TermLexicon:
+    """Sorted term lexicon supporting prefix and wildcard lookups.
+
+    Prefix queries (`comput*`) are answered with a binary search over the
+    sorted terms. Other wildcards (`*puter`, `co*ter`) use a k-gram index
+    mapping every k-gram of `$term$` to the positions of the terms containing
+    it. Candidates from the k-gram index are then checked against the pattern.
+
+    Attributes
+    ----------
+    terms: List[str]
+        Terms in ascending order
+    term_ids: List[int]
+        termIDs of `terms`, position by position
+    k: int
+        Length of the k-grams
+    kgram_index: Dict[str, List[int]]
+        Maps a k-gram to the ascending positions in `terms` of the terms
+        containing it
+    """
+
+    def __init__(self, terms: list[str], term_ids: list[int], k: int = 3):
+        self.terms = terms
+        self.term_ids = term_ids
+        self.k = k
+
+        self.kgram_index = {}
+        for position, term in enumerate(terms):
+            for kgram in set(self._kgrams(BOUNDARY + term + BOUNDARY)):
+                self.kgram_index.setdefault(kgram, []).append(position)
+
+    @classmethod
+    def from_id_map(cls, term_id_map: IdMap, k: int = 3) -> "TermLexicon":
+        """Builds the lexicon of every term in `term_id_map`"""
+        pairs = sorted(zip(term_id_map.id_to_str, range(len(term_id_map))))
+        terms = [term for term, _ in pairs]
+        term_ids = [term_id for _, term_id in pairs]
+        return cls(terms, term_ids, k)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _kgrams(self, fragment: str) -> list[str]:
+        return [fragment[i : i + self.k] for i in range(len(fragment) - self.k + 1)]
+
+    def prefix_range(self, prefix: str) -> tuple[int, int]:
+        """Returns the [start, end) positions of the terms starting with `prefix`"""
+        start = bisect_left(self.terms, prefix)
+        end = bisect_left(self.terms, prefix + _MAX_CHAR, lo=start)
+        return start, end
+
+    def expand(self, pattern: str) -> list[int]:
+        """Returns the termIDs of the terms matching `pattern`, where `*`
+        matches any (possibly empty) sequence of characters.
+
+        Terms are returned in term order. A pattern without wildcards
+        expands to its own termID, if it is in the lexicon.
+        """
+        head = pattern.split(WILDCARD, 1)[0]
+        start, end = self.prefix_range(head)
+        if WILDCARD not in pattern:
+            if start < end and self.terms[start] == pattern:
+                return [self.term_ids[start]]
+            return []
+        if pattern == head + WILDCARD:
+            return self.term_ids[start:end]
+
+        fragments = (BOUNDARY + pattern + BOUNDARY).split(WILDCARD)
+        kgrams = {kgram for fragment in fragments for kgram in self._kgrams(fragment)}
+        if kgrams:
+            position_lists = sorted(
+                (self.kgram_index.get(kgram, []) for kgram in kgrams), key=len
+            )
+            positions = position_lists[0]
+            for position_list in position_lists[1:]:
+                positions = sorted_intersect(positions, position_list)
+            # Keep the candidates within the prefix range
+            positions = positions[
+                bisect_left(positions, start) : bisect_left(positions, end)
+            ]
+        else:
+            positions = range(start, end)
+
+        parts = pattern.split(WILDCARD)
+        regex = re.compile(".*".join(re.escape(part) for part in parts))
+        return [self.term_ids[p] for p in positions if regex.fullmatch(self.terms[p])]
@@ -0,0 +1,140 @@
+import itertools
+import pickle as pkl
+from collections import Counter
+from pathlib import Path
+
+from .inverted_index import InvertedIndexMapper, InvertedIndexWriter
+from .lexicon import WILDCARD
+from .utils import IdMap, intersect_postings
+
+
+def index_fingerprint(index_name: str, directory: str | Path) -> tuple:
+    """Identifies a version of the index files of `index_name` by their sizes
+    and modification times"""
+    fingerprint = []
+    for suffix in (".index", ".dict"):
+        stat = (Path(directory) / f"{index_name}{suffix}").stat()
+        fingerprint.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+def mine_frequent_pairs(queries, min_count: int = 2) -> list[tuple[str, str]]:
+    """Counts the co-occurrences of term pairs in a query log
+
+    Parameters
+    ----------
+    queries: Iterable[str]
+        Space separated queries, e.g. the lines of a query log
+    min_count: int
+        Minimum number of queries a pair must appear in
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        Term pairs (in lexicographic order) by decreasing frequency
+    """
+    counts = Counter()
+    for query in queries:
+        terms = sorted({t for t in query.split() if WILDCARD not in t})
+        counts.update(itertools.combinations(terms, 2))
+    return [pair for pair, count in counts.most_common() if count >= min_count]
+
+
+class PairCache:
+    """Auxiliary index of precomputed intersections of frequent term pairs.
+
+    The intersections are stored in the `<index_name>.pairs` index, keyed by
+    the (smaller termID, larger termID) pair. The term pairs, the size
+    budget and the fingerprint of the main index they were computed from
+    are kept in `<index_name>.pairs.meta`, so the cache can be detected as
+    stale and rebuilt when the main index changes.
+    """
+
+    def __init__(self, index_name: str, directory: str | Path, postings_encoding):
+        self.index_name = index_name
+        self.name = f"{index_name}.pairs"
+        self.directory = Path(directory)
+        self.postings_encoding = postings_encoding
+        self.meta_path = self.directory / f"{self.name}.meta"
+
+        self.pairs = []
+        self.budget_bytes = 0
+        self.fingerprint = None
+
+    def exists(self) -> bool:
+        return self.meta_path.exists()
+
+    def load(self):
+        with open(self.meta_path, "rb") as f:
+            self.pairs, self.budget_bytes, self.fingerprint = pkl.load(f)
+        return self
+
+    def is_fresh(self) -> bool:
+        """Whether the cache was built from the current main index"""
+        return self.fingerprint == index_fingerprint(self.index_name, self.directory)
+
+    @staticmethod
+    def key(term_id1: int, term_id2: int) -> tuple[int, int]:
+        return (min(term_id1, term_id2), max(term_id1, term_id2))
+
+    def build(
+        self, pairs: list[tuple[str, str]], term_id_map: IdMap, budget_bytes: int
+    ):
+        """Intersects the postings of `pairs` in the main index and writes them
+        until the encoded postings reach `budget_bytes`
+
+        Pairs are considered in order, so they should be sorted by decreasing
+        usefulness. Pairs with unknown terms or an empty intersection are
+        skipped.
+        """
+        self.pairs = pairs
+        self.budget_bytes = budget_bytes
+        used_bytes = 0
+        with (
+            InvertedIndexMapper(
+                self.index_name,
+                directory=self.directory,
+                postings_encoding=self.postings_encoding,
+            ) as index,
+            InvertedIndexWriter(
+                self.name,
+                directory=self.directory,
+                postings_encoding=self.postings_encoding,
+            ) as cache,
+        ):
+            for term1, term2 in pairs:
+                term_id1 = term_id_map.str_to_id.get(term1)
+                term_id2 = term_id_map.str_to_id.get(term2)
+                if term_id1 is None or term_id2 is None:
+                    continue
+                postings = list(intersect_postings(index[term_id1], index[term_id2]))
+                if not postings:
+                    continue
+                n_bytes = len(cache.postings_encoding.encode(postings))
+                if used_bytes + n_bytes > budget_bytes:
+                    continue
+                cache.append(self.key(term_id1, term_id2), postings)
+                used_bytes += n_bytes
+
+        self.fingerprint = index_fingerprint(self.index_name, self.directory)
+        with open(self.meta_path, "wb") as f:
+            pkl.dump([self.pairs, self.budget_bytes, self.fingerprint], f)
+
+    def plan(self, term_ids: list[int], cache: InvertedIndexMapper):
+        """Picks cached pairs covering disjoint terms of a query
+
+        Returns
+        -------
+        Tuple[List[Tuple[int, int]], List[int]]
+            Keys of the cached intersections to use, and the termIDs not
+            covered by any of them
+        """
+        keys, covered = [], set()
+        for term_id1, term_id2 in itertools.combinations(dict.fromkeys(term_ids), 2):
+            if term_id1 in covered or term_id2 in covered:
+                continue
+            key = self.key(term_id1, term_id2)
+            if key in cache.postings_dict:
+                keys.append(key)
+                covered.update(key)
+        return keys, [t for t in term_ids if t not in covered]
@@ -1,5 +1,7 @@
 import array
 
+from .bitmap import ARRAY_MAX_CARDINALITY, RoaringBitmap
+
 
 class UncompressedPostings:
     @staticmethod
@@ -38,6 +40,26 @@ class UncompressedPostings:
         decoded_postings_list.frombytes(encoded_postings_list)
         return decoded_postings_list.tolist()
 
+    @staticmethod
+    def decode_array(encoded_postings_list: bytes):
+        """Decodes postings_list into a NumPy array without copying
+
+        Parameters
+        ----------
+        encoded_postings_list: bytes
+            bytearray representing encoded postings list as output by encode
+            function
+
+        Returns
+        -------
+        np.ndarray
+            Read-only array of docIDs viewing `encoded_postings_list`
+        """
+        import numpy as np
+
+        dtype = np.dtype(f"u{array.array('L').itemsize}")
+        return np.frombuffer(encoded_postings_list, dtype=dtype)
+
 
 class CompressedPostings:
     # If you need any extra helper methods you can add them here
@@ -104,3 +126,106 @@ class CompressedPostings:
         for gap in gaps[1:]:
             postings.append(postings[-1] + gap)
         return postings
+
+    @staticmethod
+    def decode_array(encoded_postings_list: bytes):
+        """Decodes a byte representation of compressed postings list into a
+        NumPy array, decoding all the variable byte gaps at once
+
+        Parameters
+        ----------
+        encoded_postings_list: bytes
+            Bytes representation as produced by `CompressedPostings.encode`
+
+        Returns
+        -------
+        np.ndarray
+            Decoded postings list as an uint64 array
+        """
+        import numpy as np
+
+        encoded = np.frombuffer(encoded_postings_list, dtype=np.uint8)
+        ends = np.flatnonzero(encoded >= 128)
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        # Each byte contributes 7 bits, shifted by its distance to the last
+        # byte of its number
+        group_ends = np.repeat(ends, ends - starts + 1)
+        shifts = (group_ends - np.arange(len(encoded))).astype(np.uint64) * 7
+        values = (encoded & 127).astype(np.uint64) << shifts
+        gaps = np.add.reduceat(values, starts)
+        return np.cumsum(gaps, dtype=np.uint64)
+
+
+class HybridPostings:
+    """Stores sparse postings lists as sorted lists and dense ones as bitmaps.
+
+    A postings list is considered dense when it has at least
+    `min_cardinality` postings and covers at least `density_threshold` of the
+    docIDs up to its last posting. Dense lists (e.g. stopwords) are decoded
+    into a `RoaringBitmap`, which can be intersected with word-level
+    operations, see `utils.intersect_postings`. Shorter lists, such as the
+    short lists of small docIDs of terms only found early in the collection,
+    are stored as lists: below a full array container, a bitmap is no
+    smaller and only adds a probe per posting of the other list.
+    """
+
+    density_threshold = 1 / 16
+    min_cardinality = ARRAY_MAX_CARDINALITY
+    # Encoding used for the postings lists stored as lists
+    list_encoding = UncompressedPostings
+
+    LIST_FLAG = b"\x00"
+    BITMAP_FLAG = b"\x01"
+
+    @classmethod
+    def is_dense(cls, postings_list: list[int]) -> bool:
+        if len(postings_list) < cls.min_cardinality:
+            return False
+        return len(postings_list) / (postings_list[-1] + 1) >= cls.density_threshold
+
+    @classmethod
+    def encode(cls, postings_list: list[int]) -> bytes:
+        """Encodes `postings_list` prefixed by a one-byte flag telling whether
+        it is stored as a list or as a bitmap
+
+        Parameters
+        ----------
+        postings_list: List[int]
+            The postings list to be encoded
+
+        Returns
+        -------
+        bytes:
+            Flag followed by the list or bitmap encoding of the postings
+        """
+        if cls.is_dense(postings_list):
+            return cls.BITMAP_FLAG + RoaringBitmap.from_list(postings_list).to_bytes()
+        return cls.LIST_FLAG + cls.list_encoding.encode(postings_list)
+
+    @classmethod
+    def decode(cls, encoded_postings_list: bytes) -> list[int] | RoaringBitmap:
+        """Decodes a postings list encoded by `HybridPostings.encode`
+
+        Parameters
+        ----------
+        encoded_postings_list: bytes
+            Bytes representation as produced by `HybridPostings.encode`
+
+        Returns
+        -------
+        List[int] | RoaringBitmap
+            Sorted list of docIDs for sparse terms, bitmap for dense terms
+        """
+        flag, payload = encoded_postings_list[:1], encoded_postings_list[1:]
+        if flag == cls.BITMAP_FLAG:
+            return RoaringBitmap.from_bytes(payload)
+        return cls.list_encoding.decode(payload)
+
+    @classmethod
+    def decode_array(cls, encoded_postings_list: bytes):
+        """Decodes a postings list encoded by `HybridPostings.encode` into a
+        NumPy array, whichever representation it is stored in"""
+        flag, payload = encoded_postings_list[:1], encoded_postings_list[1:]
+        if flag == cls.BITMAP_FLAG:
+            return RoaringBitmap.from_bytes(payload).to_array()
+        return cls.list_encoding.decode_array(payload)
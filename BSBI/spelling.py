@@ -0,0 +1,95 @@
+from spelling_corrector.candidate_generator import CandidateGenerator
+from spelling_corrector.edit_probability_model import (
+    BaseEditProbabilityModel,
+    UniformEditProbabilityModel,
+)
+from spelling_corrector.scorer import CandidateScorer
+from spelling_corrector.term_id_language_model import TermIdLanguageModel
+
+from .BSBI import BSBIIndex
+from .lexicon import WILDCARD
+
+
+class SpellingIndex(BSBIIndex):
+    """`BSBIIndex` with a "did you mean" spelling corrector.
+
+    The language model of the corrector is counted while `index` parses the
+    blocks and is keyed by `term_id_map`, so the vocabulary is stored once.
+    Its vocabulary is exactly the indexed terms, which restricts spelling
+    candidates to terms that have postings. The counts are saved next to the
+    index in `terms.lm`.
+
+    Attributes
+    ----------
+    language_model(TermIdLanguageModel): Unigram and bigram counts of the
+        corpus, keyed by `term_id_map`
+    epm(BaseEditProbabilityModel): Edit model of the corrector
+    mu(float): Weight of the language model in the corrector
+    """
+
+    def __init__(
+        self,
+        data_dir,
+        output_dir,
+        index_name="BSBI",
+        lambda_: float = 0.1,
+        mu: float = 1.0,
+        epm: BaseEditProbabilityModel | None = None,
+        **kwargs,
+    ):
+        super().__init__(data_dir, output_dir, index_name, **kwargs)
+        self.language_model = TermIdLanguageModel(self.term_id_map, lambda_)
+        self.epm = epm if epm is not None else UniformEditProbabilityModel()
+        self.mu = mu
+        self.scorer = None
+
+    def parse_document(self, tokens: list[str]) -> set[int]:
+        """Maps the tokens of a document to its set of termIDs, as
+        `BSBIIndex.parse_document`, and counts its unigrams and bigrams in
+        `language_model`"""
+        token_ids = [self.term_id_map[term] for term in tokens]
+        self.language_model.add_tokens(token_ids)
+        return set(token_ids)
+
+    def save(self):
+        """Dumps the id maps, as `BSBIIndex.save`, and the language model"""
+        super().save()
+        self.language_model.save(self.output_dir / "terms.lm")
+
+    def load_terms(self):
+        """Loads term_id_map and the language model keyed by it"""
+        super().load_terms()
+        self.language_model = TermIdLanguageModel.load(
+            self.output_dir / "terms.lm",
+            self.term_id_map,
+            self.language_model.lambda_,
+        )
+        self.scorer = None
+
+    def _get_scorer(self) -> CandidateScorer:
+        if len(self.term_id_map) == 0:
+            self.load_terms()
+        if self.scorer is None:
+            lm = self.language_model
+            self.scorer = CandidateScorer(lm, CandidateGenerator(lm, self.epm), self.mu)
+        return self.scorer
+
+    def search(self, query: str) -> tuple[str, list[str]]:
+        """Retrieves the documents matching the conjunctive `query`, and
+        retries with its spelling corrected if there are none
+
+        Queries with wildcards are not corrected.
+
+        Result
+        ------
+        Tuple[str, List[str]]
+            The query that was answered, `query` itself unless it was
+            corrected, and its sorted documents
+        """
+        results = self.retrieve(query)
+        if results or not query.split() or WILDCARD in query:
+            return query, results
+        corrected = self._get_scorer().correct_spelling(query)
+        if corrected == query:
+            return query, results
+        return corrected, self.retrieve(corrected)
@@ -0,0 +1,53 @@
+class IndexStats:
+    """Counters of the work done by inverted index readers.
+
+    Pass an instance to `InvertedIndexMapper` or `InvertedIndexIterator` to
+    enable instrumentation. Readers without stats skip all the bookkeeping.
+
+    Attributes
+    ----------
+    seeks: int
+        Number of seeks in the index file
+    bytes_read: int
+        Number of bytes read from the index file
+    postings_decoded: int
+        Number of postings decoded
+    decode_time: float
+        Seconds spent decoding postings lists
+    lookups: int
+        Number of lookups of a term in the postings dict
+    misses: int
+        Lookups of terms not in the index
+    """
+
+    fields = (
+        "seeks",
+        "bytes_read",
+        "postings_decoded",
+        "decode_time",
+        "lookups",
+        "misses",
+    )
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seeks = 0
+        self.bytes_read = 0
+        self.postings_decoded = 0
+        self.decode_time = 0.0
+        self.lookups = 0
+        self.misses = 0
+
+    def add(self, other: "IndexStats"):
+        """Accumulates the counters of `other` into these stats"""
+        for field in self.fields:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.fields}
+
+    def __repr__(self) -> str:
+        counters = ", ".join(f"{k}={v}" for k, v in self.as_dict().items())
+        return f"IndexStats({counters})"
@@ -1,3 +1,11 @@
+import array
+import heapq
+import mmap
+from pathlib import Path
+
+from .bitmap import RoaringBitmap
+
+
 class IdMap:
     """Helper class to store a mapping from strings to ids."""
 
@@ -39,6 +47,56 @@ class IdMap:
             raise TypeError
 
 
+class MappedIdMap:
+    """Read-only id -> string map backed by a memory-mapped file.
+
+    Opening the map only maps the file, strings are decoded on access. This
+    makes it cheap to load in short-lived processes that resolve a handful
+    of ids. The file layout is
+    [n] + [offset_0, ..., offset_n] + utf-8 encoded strings,
+    with all integers stored as native unsigned 64-bit values.
+    """
+
+    def __init__(self, path: str | Path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        n = self._view[:8].cast("Q")[0]
+        self._offsets = self._view[8 : 8 * (n + 2)].cast("Q")
+        self._data_start = 8 * (n + 2)
+        self._len = n
+
+    @staticmethod
+    def write(path: str | Path, strings: list[str]):
+        """Writes `strings` so that string i can be mapped back from id i"""
+        encoded = [s.encode() for s in strings]
+        offsets = array.array("Q", [0])
+        for e in encoded:
+            offsets.append(offsets[-1] + len(e))
+        with open(path, "wb") as f:
+            f.write(array.array("Q", [len(encoded)]).tobytes())
+            f.write(offsets.tobytes())
+            f.write(b"".join(encoded))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, key: int) -> str | None:
+        """Returns the string for id `key`, None if it is out of range"""
+        if not isinstance(key, int):
+            raise TypeError("MappedIdMap only maps ids to strings")
+        if not 0 <= key < self._len:
+            return None
+        start = self._data_start + self._offsets[key]
+        end = self._data_start + self._offsets[key + 1]
+        return str(self._view[start:end], "utf-8")
+
+    def close(self):
+        self._offsets.release()
+        self._view.release()
+        self._mmap.close()
+
+
 def sorted_intersect(list1: list[int], list2: list[int]) -> list[int]:
     """Intersects two (ascending) sorted lists and returns the sorted result
 
@@ -67,4 +125,81 @@ def sorted_intersect(list1: list[int], list2: list[int]) -> list[int]:
         else:
             j += 1
 
-    return result
\ No newline at end of file
+    return result
+
+
+def intersect_postings(
+    postings1: list[int] | RoaringBitmap, postings2: list[int] | RoaringBitmap
+) -> list[int] | RoaringBitmap:
+    """Intersects two postings lists, each stored as a sorted list or a bitmap
+
+    Bitmap-bitmap intersections are done container by container, list-bitmap
+    intersections probe each posting of the list against the bitmap, and
+    list-list intersections fall back to `sorted_intersect`.
+
+    Returns
+    -------
+    List[int] | RoaringBitmap
+        Sorted intersection. Only a bitmap when both inputs are bitmaps.
+    """
+    is_bitmap1 = isinstance(postings1, RoaringBitmap)
+    is_bitmap2 = isinstance(postings2, RoaringBitmap)
+    if is_bitmap1 and is_bitmap2:
+        return postings1 & postings2
+    if is_bitmap1:
+        return postings1.intersect_list(postings2)
+    if is_bitmap2:
+        return postings2.intersect_list(postings1)
+    return sorted_intersect(postings1, postings2)
+
+
+def intersect_arrays(array1, array2):
+    """Intersects two ascending sorted NumPy arrays of docIDs
+
+    Every element of the shorter array is located in the longer one with a
+    vectorized binary search, so the cost is O(m log n) for lengths m <= n.
+
+    Returns
+    -------
+    np.ndarray
+        Sorted intersection
+    """
+    import numpy as np
+
+    if len(array1) > len(array2):
+        array1, array2 = array2, array1
+    if len(array1) == 0:
+        return array1
+    positions = np.searchsorted(array2, array1)
+    positions[positions == len(array2)] = 0
+    return array1[array2[positions] == array1]
+
+
+def union_postings(postings_lists: list) -> list[int]:
+    """Unions sorted postings lists (or bitmaps) with a k-way merge
+
+    Returns
+    -------
+    List[int]
+        Sorted union without duplicates
+    """
+    result = []
+    for doc_id in heapq.merge(*postings_lists):
+        if not result or result[-1] != doc_id:
+            result.append(doc_id)
+    return result
+
+
+def union_arrays(arrays: list):
+    """Unions sorted NumPy arrays of docIDs
+
+    Returns
+    -------
+    np.ndarray
+        Sorted union without duplicates
+    """
+    import numpy as np
+
+    if not arrays:
+        return np.empty(0, dtype=np.uint64)
+    return np.unique(np.concatenate(arrays))
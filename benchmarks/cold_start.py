@@ -0,0 +1,91 @@
+"""Cold-start benchmark for BSBIIndex.retrieve.
+
+Builds a synthetic corpus, indexes it and then measures, in fresh
+interpreters, the time to import BSBI and answer a first query with eager
+and lazy loading of the id maps.
+
+Usage:
+    python benchmarks/cold_start.py [--blocks 4] [--docs 1000] [--runs 10]
+"""
+
+import argparse
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = textwrap.dedent(
+    """
+    import time
+    start = time.perf_counter()
+    from BSBI.BSBI import BSBIIndex
+    index = BSBIIndex({data_dir!r}, {output_dir!r}, lazy_load={lazy})
+    index.retrieve({query!r})
+    print(time.perf_counter() - start)
+    """
+)
+
+
+def build_corpus(data_dir: Path, n_blocks: int, n_docs: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(20_000)]
+    for block in range(n_blocks):
+        block_dir = data_dir / str(block)
+        block_dir.mkdir(parents=True)
+        for doc in range(n_docs):
+            words = rng.choices(vocabulary, k=200)
+            (block_dir / f"doc{doc}.txt").write_text(" ".join(words))
+
+
+def time_cold_start(data_dir, output_dir, query, lazy, runs):
+    probe = PROBE.format(
+        data_dir=str(data_dir), output_dir=str(output_dir), query=query, lazy=lazy
+    )
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", probe],
+            cwd=REPO_ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        timings.append(float(out.stdout.strip()))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=4)
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(REPO_ROOT))
+    from BSBI.BSBI import BSBIIndex
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir, output_dir = Path(tmp) / "data", Path(tmp) / "output"
+        output_dir.mkdir()
+        build_corpus(data_dir, args.blocks, args.docs)
+        BSBIIndex(data_dir, output_dir).index()
+
+        for query in ["term1 term2", "missing"]:
+            for lazy in (False, True):
+                timings = time_cold_start(
+                    data_dir, output_dir, query, lazy, args.runs
+                )
+                print(
+                    f"query={query!r:16} lazy={lazy!s:5} "
+                    f"median={statistics.median(timings) * 1000:8.2f}ms "
+                    f"min={min(timings) * 1000:8.2f}ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Accuracy and latency benchmark for the spelling corrector.
+
+Corrects every query of a dev set and reports the accuracy together with
+the p50/p99 correction latency, the peak memory of the process and the
+per-stage stats of `CandidateScorer.enable_stats`, so changes to `mu`,
+`lambda_` or the candidate generator can be judged on both axes at once.
+
+The dev set is either a file of tab-separated "raw<TAB>corrected" lines, or
+a file of raw queries with `--gold` pointing to the line-aligned corrections.
+
+Usage:
+    python benchmarks/spelling.py CORPUS_DIR QUERIES [--gold GOLD]
+        [--mu 1.0] [--lambda 0.1] [--edit-prob 0.05] [--edit-pairs PAIRS]
+        [--candidate-index] [--limit N]
+"""
+
+import argparse
+import json
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_dev_set(queries: Path, gold: Path | None = None) -> list[tuple[str, str]]:
+    """Reads (raw, corrected) query pairs"""
+    with open(queries, encoding="utf-8") as f:
+        raw = [line.rstrip("\n") for line in f]
+    if gold is None:
+        return [tuple(line.split("\t", 1)) for line in raw if "\t" in line]
+    with open(gold, encoding="utf-8") as f:
+        corrected = [line.rstrip("\n") for line in f]
+    return list(zip(raw, corrected))
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of `values`"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def run(scorer, dev_set: list[tuple[str, str]]) -> dict:
+    """Corrects each raw query of `dev_set` with `scorer` and reports the
+    accuracy, latencies and correction stats"""
+    if dev_set:
+        # Warm up lazy imports outside of the timed queries
+        scorer.correct_spelling(dev_set[0][0])
+    stats = scorer.enable_stats()
+    latencies = []
+    n_correct = 0
+    for raw, corrected in dev_set:
+        start = time.perf_counter()
+        prediction = scorer.correct_spelling(raw)
+        latencies.append(time.perf_counter() - start)
+        n_correct += prediction == corrected
+    scorer.disable_stats()
+
+    return {
+        "queries": len(dev_set),
+        "accuracy": n_correct / len(dev_set) if dev_set else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else 0.0,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else 0.0,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stats": stats.as_dict(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus_dir", type=Path)
+    parser.add_argument("queries", type=Path)
+    parser.add_argument("--gold", type=Path, default=None)
+    parser.add_argument("--mu", type=float, default=1.0)
+    parser.add_argument("--lambda", dest="lambda_", type=float, default=0.1)
+    parser.add_argument("--edit-prob", type=float, default=0.05)
+    parser.add_argument(
+        "--edit-pairs",
+        type=Path,
+        default=None,
+        help="Train a confusion matrix edit model from these pairs",
+    )
+    parser.add_argument("--candidate-index", action="store_true")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(REPO_ROOT))
+    from spelling_corrector.candidate_generator import CandidateGenerator
+    from spelling_corrector.edit_probability_model import (
+        ConfusionMatrixEditProbabilityModel,
+        UniformEditProbabilityModel,
+    )
+    from spelling_corrector.language_model import LanguageModel
+    from spelling_corrector.scorer import CandidateScorer
+
+    dev_set = load_dev_set(args.queries, args.gold)[: args.limit]
+
+    start = time.perf_counter()
+    lm = LanguageModel(corpus_dir=args.corpus_dir, lambda_=args.lambda_)
+    if args.edit_pairs is not None:
+        epm = ConfusionMatrixEditProbabilityModel.from_file(
+            args.edit_pairs, edit_prob=args.edit_prob
+        )
+    else:
+        epm = UniformEditProbabilityModel(edit_prob=args.edit_prob)
+    cg = CandidateGenerator(lm=lm, epm=epm)
+    if args.candidate_index:
+        cg.build_candidate_index()
+    scorer = CandidateScorer(lm, cg, mu=args.mu)
+    load_time = time.perf_counter() - start
+
+    report = run(scorer, dev_set)
+    report["load_s"] = load_time
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import array
+import math
+import operator
+import zlib
+from collections import Counter
+from functools import partial
+from pathlib import Path
+
+from .language_model import LanguageModel, count_in_chunks, count_ngrams
+
+
+class CountMinSketch:
+    """Approximate counter using a fixed amount of memory.
+
+    Each key increments one counter in each of `depth` rows of `width`
+    counters, and its count is estimated as the minimum of these counters.
+    Estimates never underestimate. With probability at least 1 - delta each
+    estimate exceeds the true count by at most epsilon * total, where
+    epsilon = e / width and delta = exp(-depth).
+
+    Attributes
+    ----------
+    width(int): Number of counters per row
+    depth(int): Number of rows (hash functions)
+    total(int): Sum of all the counts added
+    min_count(int): Estimates below this count are reported as 0, which
+        prunes rare keys from lookups
+    """
+
+    def __init__(self, width: int, depth: int = 4, min_count: int = 0):
+        self.width = width
+        self.depth = depth
+        self.min_count = min_count
+        self.total = 0
+        self.table = array.array("Q", bytes(8 * width * depth))
+
+    @classmethod
+    def from_memory(cls, max_bytes: int, depth: int = 4, min_count: int = 0):
+        """Creates the widest sketch whose counters fit in `max_bytes`"""
+        return cls(max(1, max_bytes // (8 * depth)), depth, min_count)
+
+    def _indices(self, key: tuple[str, ...]) -> list[int]:
+        # Double hashing with stable hashes, so sketches built in different
+        # processes can be merged
+        encoded = "\x00".join(key).encode()
+        h1 = zlib.crc32(encoded)
+        h2 = zlib.adler32(encoded) | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, key: tuple[str, ...], count: int = 1):
+        table = self.table
+        for i in self._indices(key):
+            table[i] += count
+        self.total += count
+
+    def update(self, keys):
+        """Adds 1 for each of `keys`, or the counts of a mapping from keys to
+        counts, as `Counter.update`"""
+        items = keys.items() if hasattr(keys, "items") else ((k, 1) for k in keys)
+        # Same indices as `_indices`, inlined as this is the counting loop
+        table, width, rows = self.table, self.width, range(self.depth)
+        total = 0
+        for key, count in items:
+            encoded = "\x00".join(key).encode()
+            h1 = zlib.crc32(encoded)
+            h2 = zlib.adler32(encoded) | 1
+            for row in rows:
+                table[row * width + (h1 + row * h2) % width] += count
+            total += count
+        self.total += total
+
+    def merge(self, other: "CountMinSketch"):
+        """Adds the counts of a sketch with the same dimensions"""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Can only merge sketches with the same dimensions")
+        self.table = array.array("Q", map(operator.add, self.table, other.table))
+        self.total += other.total
+
+    def __getitem__(self, key: tuple[str, ...]) -> int:
+        estimate = min(self.table[i] for i in self._indices(key))
+        return estimate if estimate >= self.min_count else 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.itemsize * len(self.table)
+
+    def error_bounds(self) -> tuple[float, float]:
+        """Returns (max_overestimate, failure_probability): with probability
+        at least 1 - failure_probability, an estimate exceeds the true count
+        by at most max_overestimate"""
+        return math.e / self.width * self.total, math.exp(-self.depth)
+
+
+def count_sketch(
+    files, width: int, depth: int, min_count: int
+) -> tuple[int, Counter, CountMinSketch]:
+    """Counts the tokens and unigrams of `files`, and their bigrams in a
+    `CountMinSketch` of the given dimensions.
+
+    The bigrams of each file are first counted exactly with `count_ngrams`,
+    so the sketch is updated once per distinct bigram of a file rather than
+    once per occurrence.
+
+    Returns:
+        (total_num_tokens, unigram_counts, bigram_sketch)
+    """
+    total_num_tokens = 0
+    unigram_counts = Counter()
+    bigram_sketch = CountMinSketch(width, depth, min_count)
+    for file in files:
+        num_tokens, file_unigrams, file_bigrams = count_ngrams([file])
+        total_num_tokens += num_tokens
+        unigram_counts.update(file_unigrams)
+        bigram_sketch.update(file_bigrams)
+    return total_num_tokens, unigram_counts, bigram_sketch
+
+
+class ApproximateLanguageModel(LanguageModel):
+    """`LanguageModel` whose bigram counts are kept in a `CountMinSketch`.
+
+    Unigrams are still counted exactly, since they define the vocabulary
+    used for candidate generation, but the bigram counts take a fixed
+    `max_bigram_bytes` however large the corpus is. `get_bigram_logp` reads
+    the (over)estimated counts from the sketch.
+    """
+
+    def __init__(
+        self,
+        corpus_dir: Path = Path("pa2-data/corpus"),
+        lambda_: float = 0.1,
+        max_bigram_bytes: int = 64 << 20,
+        depth: int = 4,
+        min_bigram_count: int = 0,
+        workers: int = 1,
+    ):
+        """
+        Args:
+            corpus_dir (str): Path to directory containing corpus.
+            lambda_ (float): Interpolation factor for smoothing by unigram-bigram
+                interpolation.
+            max_bigram_bytes (int): Memory budget of the bigram sketch.
+            depth (int): Number of hash functions of the sketch. Higher depths
+                lower the probability of exceeding the error bound.
+            min_bigram_count (int): Bigrams estimated below this count are
+                treated as unseen.
+            workers (int): Number of processes used to count the corpus, as
+                in `LanguageModel`. Each worker fills its own sketch and the
+                sketches are merged, which gives the same counts for any
+                number of workers.
+        """
+        self.lambda_ = lambda_
+        self.total_num_tokens = 0
+        self.unigram_counts = Counter()
+        self.bigram_counts = CountMinSketch.from_memory(
+            max_bigram_bytes, depth, min_bigram_count
+        )
+
+        count = partial(
+            count_sketch,
+            width=self.bigram_counts.width,
+            depth=depth,
+            min_count=min_bigram_count,
+        )
+        files = sorted(corpus_dir.iterdir())
+        for counts in count_in_chunks(count, files, workers):
+            self._add_counts(counts)
+
+    def _add_counts(self, counts: tuple[int, Counter, CountMinSketch]):
+        """Merges partial counts as returned by `count_sketch`"""
+        total_num_tokens, unigram_counts, bigram_sketch = counts
+        self.total_num_tokens += total_num_tokens
+        if not self.unigram_counts:
+            # Adopt the first partial counts instead of copying them
+            self.unigram_counts = unigram_counts
+            self.bigram_counts = bigram_sketch
+            return
+        self.unigram_counts.update(unigram_counts)
+        self.bigram_counts.merge(bigram_sketch)
+
+    def get_bigram_logp(self, w_1: str, w_2: str) -> float:
+        """Computes the interpolated log-probability of the bigram, as
+        `LanguageModel.get_bigram_logp`.
+
+        A bigram cannot occur more often than its first word, so estimates
+        are clamped to the unigram count of `w_1`.
+        """
+        unigram_count = self.unigram_counts[w_1]
+        bigram_count = min(self.bigram_counts[(w_1, w_2)], unigram_count)
+        prob_seq = bigram_count / unigram_count
+        prob_uni = self.unigram_counts[w_2] / self.total_num_tokens
+
+        interpolation = self.lambda_ * prob_uni + (1 - self.lambda_) * prob_seq
+        return math.log(interpolation)
+
+    def error_bounds(self) -> dict:
+        """Reports the memory used by the bigram sketch and its error bounds"""
+        max_overestimate, failure_probability = self.bigram_counts.error_bounds()
+        return {
+            "bigram_bytes": self.bigram_counts.nbytes,
+            "max_bigram_overestimate": max_overestimate,
+            "failure_probability": failure_probability,
+        }
+
+    def agreement(self, exact: LanguageModel, queries) -> dict:
+        """Compares query log-probabilities with an exact `LanguageModel`
+
+        Args:
+            exact (LanguageModel): Model built from the same corpus with
+                exact counts.
+            queries (Iterable[str]): Held-out queries. Queries with out of
+                vocabulary terms are skipped.
+
+        Returns:
+            dict with the number of queries compared, the mean and max
+            absolute log-probability difference, and the fraction of
+            queries whose log-probabilities agree within 1e-9.
+        """
+        errors = []
+        for query in queries:
+            terms = query.split()
+            if not terms or any(t not in exact.unigram_counts for t in terms):
+                continue
+            logp = self.get_query_logp(query)
+            errors.append(abs(logp - exact.get_query_logp(query)))
+        if not errors:
+            return {"n_queries": 0}
+        return {
+            "n_queries": len(errors),
+            "mean_abs_logp_error": sum(errors) / len(errors),
+            "max_abs_logp_error": max(errors),
+            "exact_fraction": sum(e < 1e-9 for e in errors) / len(errors),
+        }
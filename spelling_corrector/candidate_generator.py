@@ -1,9 +1,13 @@
 import itertools
+import time
 
 from spelling_corrector.edit_probability_model import (
     BaseEditProbabilityModel,
+    Edit,
 )
 from spelling_corrector.language_model import LanguageModel
+from spelling_corrector.stats import CorrectionStats
+from spelling_corrector.symmetric_delete import SymmetricDeleteIndex
 
 
 class CandidateGenerator:
@@ -51,42 +55,129 @@ class CandidateGenerator:
         "-",
     ]
 
-    def __init__(self, lm: LanguageModel, epm: BaseEditProbabilityModel):
+    def __init__(
+        self,
+        lm: LanguageModel,
+        epm: BaseEditProbabilityModel,
+        candidate_index: SymmetricDeleteIndex | None = None,
+        stats: CorrectionStats | None = None,
+    ):
         """
         Args:
             lm (LanguageModel): Language model to use for prior probabilities, P(Q).
             epm (EditProbabilityModel): Edit probability model to use for P(R|Q).
+            candidate_index (SymmetricDeleteIndex): Precomputed index of the
+                vocabulary of `lm`. If given, edits are looked up in it instead
+                of enumerating every edit of a term. See `build_candidate_index`.
+            stats (CorrectionStats): If given, `get_candidates` records the
+                candidates it generates and the time spent in each stage.
         """
         self.lm = lm
         self.epm = epm
+        self.candidate_index = candidate_index
+        self.stats = stats
+
+    def build_candidate_index(self) -> SymmetricDeleteIndex:
+        """Precomputes a symmetric delete index of the vocabulary of `self.lm`
+        and uses it for candidate generation from now on"""
+        self.candidate_index = SymmetricDeleteIndex(
+            self.lm.unigram_counts, self.alphabet
+        )
+        return self.candidate_index
 
     def get_num_oov(self, query: str) -> int:
         """Get the number of out-of-vocabulary (OOV) words in `query`."""
-        return sum(1 for w in query.strip().split() if w not in self.lm.unigram_counts)
+        words = query.strip().split()
+        if self.stats is not None:
+            self.stats.vocabulary_lookups += len(words)
+        return sum(1 for w in words if w not in self.lm.unigram_counts)
+
+    def filter_and_yield(self, query: str, lp: float, num_edits: int = 0):
+        if self.stats is None:
+            if query.strip() and self.get_num_oov(query) == 0:
+                yield query, lp
+            return
 
-    def filter_and_yield(self, query: str, lp: float):
-        if query.strip() and self.get_num_oov(query) == 0:
+        start = time.perf_counter()
+        keep = bool(query.strip()) and self.get_num_oov(query) == 0
+        self.stats.filter_time += time.perf_counter() - start
+        self.stats.generated[num_edits] += 1
+        if keep:
+            self.stats.yielded[num_edits] += 1
             yield query, lp
 
     def generate_edit1(self, term: str) -> list[str]:
-        splits = [(term[:i], term[i:]) for i in range(len(term) + 1)]
-        delete = [L + R[1:] for L, R in splits if R]
-        transpose = [L + R[1] + R[0] + R[2:] for L, R in splits if len(R) > 1]
-        replace = [
-            L + c + R[1:] for L, R in splits if R for c in self.alphabet if c != R[0]
-        ]
-        insert = [L + c + R for L, R in splits for c in self.alphabet]
-        return [
-            candidate
-            for candidate in set(delete + transpose + replace + insert)
-            if candidate in self.lm.unigram_counts and candidate != term
-        ]
+        return [candidate for candidate, _ in self.generate_edit1_ops(term)]
+
+    def generate_edit1_ops(self, term: str) -> list[tuple[str, Edit]]:
+        """Gets the vocabulary words one edit away from `term`.
 
-    def get_candidates(self, query: str):
+        Returns:
+            List of (candidate, edit) pairs, where `edit` turns the candidate
+                into `term`, i.e. the typo assumed by the noisy channel.
+        """
+        if self.candidate_index is not None:
+            return self.candidate_index.edit1_ops(term)
+        vocabulary = self.lm.unigram_counts
+        edits = {}
+        for i in range(len(term) + 1):
+            L, R = term[:i], term[i:]
+            prev = L[-1:]
+            position = max(i - 1, 0)
+            if R:
+                candidate = L + R[1:]
+                if candidate in vocabulary and candidate not in edits:
+                    edits[candidate] = Edit("insert", position, prev, prev + R[0])
+            if len(R) > 1:
+                candidate = L + R[1] + R[0] + R[2:]
+                if candidate in vocabulary and candidate not in edits:
+                    edits[candidate] = Edit("transpose", i, R[1] + R[0], R[:2])
+            for c in self.alphabet:
+                if R and c != R[0]:
+                    candidate = L + c + R[1:]
+                    if candidate in vocabulary and candidate not in edits:
+                        edits[candidate] = Edit("substitute", i, c, R[0])
+                candidate = L + c + R
+                if candidate in vocabulary and candidate not in edits:
+                    edits[candidate] = Edit("delete", position, prev + c, prev)
+        edits.pop(term, None)
+        return list(edits.items())
+
+    def get_term_candidates(self, term: str) -> dict[str, tuple[int, float]]:
+        """Gets the vocabulary words at most two edits away from `term`.
+
+        Returns:
+            dict mapping each candidate to (num_edits, edit_logp), where
+                edit_logp is the log-probability of typing `term` for the
+                candidate, chained through the most likely intermediate word.
+                `term` itself is included, with 0 edits, if it is in vocabulary.
+        """
+        candidates = {}
+        if term in self.lm.unigram_counts:
+            candidates[term] = (0, self.epm.get_edits_logp(term, term, []))
+        single = self.generate_edit1_ops(term)
+        for edit, op in single:
+            candidates[edit] = (1, self.epm.get_edits_logp(term, edit, [op]))
+        for edit, _ in single:
+            edit_logp = candidates[edit][1]
+            for candidate, op in self.generate_edit1_ops(edit):
+                if candidates.get(candidate, (2,))[0] < 2:
+                    continue
+                logp = edit_logp + self.epm.get_edits_logp(edit, candidate, [op])
+                if candidate not in candidates or logp > candidates[candidate][1]:
+                    candidates[candidate] = (2, logp)
+        return candidates
+
+    def get_candidates(self, query: str, deadline: float | None = None):
         """Starts from `query`, and performs EDITS OF DISTANCE <=2 to get candidates"
 
+        Candidates one edit away are generated first. The edits of distance 2
+        are expanded lazily, as the candidates are consumed.
+
         Args:
             query (str): Starting query.
+            deadline (float): If given, a `time.perf_counter()` value after
+                which no more candidates are generated.
 
         Returns:
             Iterable over tuples (cdt, cdt_edit_logp) of candidates and
@@ -95,46 +186,82 @@ class CandidateGenerator:
         """
         # Yield the unedited query first
         # We provide this line as an example of how to use `self.filter_and_yield`
-        yield from self.filter_and_yield(query, self.epm.get_edit_logp(query, query))
+        yield from self.filter_and_yield(
+            query, self.epm.get_edits_logp(query, query, [])
+        )
+
+        def expired() -> bool:
+            return deadline is not None and time.perf_counter() >= deadline
 
         terms = query.strip().split()
+        # Start of each term in the candidate queries
+        starts = [0]
+        for term in terms[:-1]:
+            starts.append(starts[-1] + len(term) + 1)
 
-        single_candidates = []
-        double_candidates = []
-        for idx, term in enumerate(terms):
-            single = self.generate_edit1(term)
-            double = [e for edit in single for e in self.generate_edit1(edit)]
-            single_candidates.append(single)
-            double_candidates.append(double)
+        single_candidates = [
+            [(edit, [op]) for edit, op in self._generate_edit1_ops(term)]
+            for term in terms
+        ]
 
         # One edit
         for idx, term in enumerate(terms):
-            for candidate in single_candidates[idx]:
-                t = terms.copy()
-                t[idx] = candidate
-                new_query = " ".join(t)
-                edit_logp = self.epm.get_edit_logp(query, new_query)
-                yield from self.filter_and_yield(new_query, edit_logp)
-
-        # Two edits
+            for candidate, ops in single_candidates[idx]:
+                if expired():
+                    return
+                new_query, edits = self._replace_term(
+                    terms, starts, idx, candidate, ops
+                )
+                edit_logp = self.epm.get_edits_logp(query, new_query, edits)
+                yield from self.filter_and_yield(new_query, edit_logp, 1)
+
+        # Two edits, expanding the edits of each single edit candidate lazily
         for idx, term in enumerate(terms):
-            for candidate in double_candidates[idx]:
-                t = terms.copy()
-                t[idx] = candidate
-                new_query = " ".join(t)
-                edit_logp = self.epm.get_edit_logp(query, new_query)
-                yield from self.filter_and_yield(new_query, edit_logp)
+            for edit, (edit_op,) in single_candidates[idx]:
+                if expired():
+                    return
+                for candidate, op in self._generate_edit1_ops(edit):
+                    new_query, edits = self._replace_term(
+                        terms, starts, idx, candidate, [op, edit_op]
+                    )
+                    edit_logp = self.epm.get_edits_logp(query, new_query, edits)
+                    yield from self.filter_and_yield(new_query, edit_logp, 2)
 
         # Two single edits
         for i, j in itertools.combinations(range(len(terms)), 2):
-            for cand_i, cand_j in itertools.product(
+            for (cand_i, ops_i), (cand_j, ops_j) in itertools.product(
                 single_candidates[i], single_candidates[j]
             ):
+                if expired():
+                    return
                 if (
                     cand_i != terms[i] and cand_j != terms[j]
                 ):  # Ensure at least one term changed
                     t = terms.copy()
                     t[i], t[j] = cand_i, cand_j
                     new_query = " ".join(t)
-                    edit_logp = self.epm.get_edit_logp(query, new_query)
-                    yield from self.filter_and_yield(new_query, edit_logp)
+                    offset_j = starts[j] + len(cand_i) - len(terms[i])
+                    edits = [op.shift(starts[i]) for op in ops_i] + [
+                        op.shift(offset_j) for op in ops_j
+                    ]
+                    edit_logp = self.epm.get_edits_logp(query, new_query, edits)
+                    yield from self.filter_and_yield(new_query, edit_logp, 2)
+
+    def _generate_edit1_ops(self, term: str) -> list[tuple[str, Edit]]:
+        """`generate_edit1_ops`, timed when stats are enabled"""
+        if self.stats is None:
+            return self.generate_edit1_ops(term)
+        start = time.perf_counter()
+        edits = self.generate_edit1_ops(term)
+        self.stats.generation_time += time.perf_counter() - start
+        return edits
+
+    @staticmethod
+    def _replace_term(
+        terms: list[str], starts: list[int], idx: int, candidate: str, ops: list[Edit]
+    ) -> tuple[str, list[Edit]]:
+        """Replaces the `idx`-th term by `candidate`, returning the new query
+        and the edits `ops` shifted to the position of the term"""
+        t = terms.copy()
+        t[idx] = candidate
+        return " ".join(t), [op.shift(starts[idx]) for op in ops]
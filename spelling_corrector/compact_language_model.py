@@ -0,0 +1,209 @@
+import array
+import mmap
+import struct
+import zlib
+from bisect import bisect_left
+from pathlib import Path
+
+from .count_views import BigramCounts, UnigramCounts
+from .language_model import LanguageModel
+
+MAGIC = b"CLM2"
+# magic, lambda_, total_num_tokens, vocabulary size, number of bigrams,
+# number of word hash table slots
+_HEADER = struct.Struct("<4s4xdQQQQ")
+
+
+class _Vocabulary:
+    """Sorted UTF-8 encoded words viewed from the snapshot buffer"""
+
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.data[self.offsets[i] : self.offsets[i + 1]])
+
+
+class CompactLanguageModel(LanguageModel):
+    """Integer-encoded `LanguageModel` stored in a single flat buffer.
+
+    Words are mapped to their rank in the sorted vocabulary. Unigram counts
+    are an array indexed by word id, and bigrams are a sorted array of packed
+    `id_1 << 32 | id_2` keys, searched with binary search, with a parallel
+    array of counts. Words are looked up in an open-addressing hash table of
+    `word id + 1` (0 for an empty slot) with linear probing, indexed by the
+    CRC-32 of the encoded word. `unigram_counts` and `bigram_counts` are
+    read-only views by word, so the log-probabilities are computed by the
+    `LanguageModel` methods. The buffer can be saved to a file and
+    memory-mapped back by `load`, so loading takes milliseconds and
+    processes mapping the same snapshot share its pages, lookup table
+    included.
+
+    Snapshot layout (native unsigned 64-bit integers after the header):
+    header + vocabulary offsets (V + 1) + unigram counts (V) +
+    bigram keys (B) + bigram counts (B) + word hash table (T, a power of
+    two) + UTF-8 encoded vocabulary
+    """
+
+    def __init__(self, buffer):
+        """
+        Args:
+            buffer: bytes-like snapshot, as produced by `to_bytes`.
+        """
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic = bytes(view[:4])
+        if magic != MAGIC:
+            raise ValueError("Not a CompactLanguageModel snapshot")
+        _, self.lambda_, self.total_num_tokens, n_words, n_bigrams, n_slots = (
+            _HEADER.unpack_from(view, 0)
+        )
+
+        offset = _HEADER.size
+        sections = []
+        for length in (n_words + 1, n_words, n_bigrams, n_bigrams, n_slots):
+            sections.append(view[offset : offset + 8 * length].cast("Q"))
+            offset += 8 * length
+        (
+            word_offsets,
+            self.unigram_array,
+            self.bigram_keys,
+            self.bigram_array,
+            self.word_table,
+        ) = sections
+        self.vocabulary = _Vocabulary(word_offsets, view[offset:])
+        self.num_words = n_words
+        self.num_bigrams = n_bigrams
+        self.unigram_counts = UnigramCounts(self)
+        self.bigram_counts = BigramCounts(self)
+
+    @classmethod
+    def from_language_model(cls, lm: LanguageModel) -> "CompactLanguageModel":
+        return cls(cls.to_bytes(lm))
+
+    @staticmethod
+    def to_bytes(lm: LanguageModel) -> bytes:
+        """Encodes the counts of `lm` into a snapshot"""
+        words = sorted(w.encode() for w in lm.unigram_counts)
+        word_ids = {w.decode(): i for i, w in enumerate(words)}
+
+        word_offsets = array.array("Q", [0])
+        for w in words:
+            word_offsets.append(word_offsets[-1] + len(w))
+        unigrams = array.array("Q", (lm.unigram_counts[w.decode()] for w in words))
+
+        bigrams = sorted(
+            (word_ids[w_1] << 32 | word_ids[w_2], count)
+            for (w_1, w_2), count in lm.bigram_counts.items()
+        )
+        bigram_keys = array.array("Q", (key for key, _ in bigrams))
+        bigram_counts = array.array("Q", (count for _, count in bigrams))
+
+        # At most half full, so probe sequences stay short
+        n_slots = 1 << max(1, (2 * len(words)).bit_length())
+        word_table = array.array("Q", bytes(8 * n_slots))
+        for word_id, w in enumerate(words):
+            slot = zlib.crc32(w) & (n_slots - 1)
+            while word_table[slot]:
+                slot = (slot + 1) & (n_slots - 1)
+            word_table[slot] = word_id + 1
+
+        header = _HEADER.pack(
+            MAGIC, lm.lambda_, lm.total_num_tokens, len(words), len(bigrams), n_slots
+        )
+        return b"".join(
+            [
+                header,
+                word_offsets.tobytes(),
+                unigrams.tobytes(),
+                bigram_keys.tobytes(),
+                bigram_counts.tobytes(),
+                word_table.tobytes(),
+                *words,
+            ]
+        )
+
+    def save(self, path: str | Path):
+        with open(path, "wb") as f:
+            f.write(self._buffer)
+
+    @classmethod
+    def load(cls, path: str | Path, lambda_: float | None = None):
+        """Memory-maps a snapshot saved by `save`
+
+        Args:
+            path (str): Path to the snapshot file.
+            lambda_ (float): Overrides the interpolation factor of the snapshot.
+        """
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        lm = cls(buffer)
+        if lambda_ is not None:
+            lm.lambda_ = lambda_
+        return lm
+
+    def word_id(self, word: str) -> int | None:
+        """Returns the id of `word`, None if it is out of vocabulary"""
+        encoded = word.encode()
+        table = self.word_table
+        offsets, data = self.vocabulary.offsets, self.vocabulary.data
+        mask = len(table) - 1
+        slot = zlib.crc32(encoded) & mask
+        while word_id := table[slot]:
+            word_id -= 1
+            # Compares in place, without copying the word out of the buffer
+            if data[offsets[word_id] : offsets[word_id + 1]] == encoded:
+                return word_id
+            slot = (slot + 1) & mask
+        return None
+
+    def word(self, word_id: int) -> str:
+        return self.vocabulary[word_id].decode()
+
+    def packed_bigram_count(self, key: int) -> int:
+        """Returns the count of the bigram of packed word ids `key`"""
+        i = bisect_left(self.bigram_keys, key)
+        if i < len(self.bigram_keys) and self.bigram_keys[i] == key:
+            return self.bigram_array[i]
+        return 0
+
+    def packed_bigram_items(self):
+        return zip(self.bigram_keys, self.bigram_array)
+
+    def batch_query_logp(self, token_ids):
+        """Computes the log-probabilities of equal-length queries at once.
+
+        Args:
+            token_ids (np.ndarray): (n_queries, n_tokens) array of word ids, as
+                returned by `word_id`. Every id must be in vocabulary.
+
+        Returns:
+            np.ndarray: Log-probability of each query, as `get_query_logp`.
+        """
+        import numpy as np
+
+        unigrams = np.frombuffer(self.unigram_array, dtype=np.uint64)
+        bigram_keys = np.frombuffer(self.bigram_keys, dtype=np.uint64)
+        bigram_counts = np.frombuffer(self.bigram_array, dtype=np.uint64)
+        token_ids = np.asarray(token_ids, dtype=np.uint64)
+
+        logp = np.log(unigrams[token_ids[:, 0]] / self.total_num_tokens)
+        for i in range(1, token_ids.shape[1]):
+            prev, cur = token_ids[:, i - 1], token_ids[:, i]
+            keys = prev << np.uint64(32) | cur
+            if len(bigram_keys):
+                positions = np.searchsorted(bigram_keys, keys)
+                positions[positions == len(bigram_keys)] = 0
+                counts = np.where(
+                    bigram_keys[positions] == keys, bigram_counts[positions], 0
+                )
+            else:
+                counts = np.zeros(len(keys))
+            prob_seq = counts / unigrams[prev]
+            prob_uni = unigrams[cur] / self.total_num_tokens
+            logp += np.log(self.lambda_ * prob_uni + (1 - self.lambda_) * prob_seq)
+        return logp
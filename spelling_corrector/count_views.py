@@ -0,0 +1,61 @@
+class UnigramCounts:
+    """Read-only, `Counter`-like view by word of unigram counts stored in an
+    array indexed by word id.
+
+    The model provides `unigram_array`, `num_words` (the number of words
+    with a non-zero count), `word_id(word)`, None for out of vocabulary
+    words, and `word(word_id)`.
+    """
+
+    def __init__(self, lm):
+        self._lm = lm
+
+    def __len__(self) -> int:
+        return self._lm.num_words
+
+    def __contains__(self, word: str) -> bool:
+        return self[word] > 0
+
+    def __getitem__(self, word: str) -> int:
+        word_id = self._lm.word_id(word)
+        return 0 if word_id is None else self._lm.unigram_array[word_id]
+
+    def __iter__(self):
+        for word, _ in self.items():
+            yield word
+
+    def items(self):
+        word = self._lm.word
+        for word_id, count in enumerate(self._lm.unigram_array):
+            if count:
+                yield word(word_id), count
+
+
+class BigramCounts:
+    """Read-only, `Counter`-like view by word pair of bigram counts keyed by
+    packed `id_1 << 32 | id_2` word ids.
+
+    The model provides `num_bigrams`, `word_id(word)`, `word(word_id)`,
+    `packed_bigram_count(key)` and `packed_bigram_items()`, the (key, count)
+    pairs of the non-zero counts.
+    """
+
+    def __init__(self, lm):
+        self._lm = lm
+
+    def __len__(self) -> int:
+        return self._lm.num_bigrams
+
+    def __contains__(self, bigram: tuple[str, str]) -> bool:
+        return self[bigram] > 0
+
+    def __getitem__(self, bigram: tuple[str, str]) -> int:
+        id_1, id_2 = self._lm.word_id(bigram[0]), self._lm.word_id(bigram[1])
+        if id_1 is None or id_2 is None:
+            return 0
+        return self._lm.packed_bigram_count(id_1 << 32 | id_2)
+
+    def items(self):
+        word = self._lm.word
+        for key, count in self._lm.packed_bigram_items():
+            yield (word(key >> 32), word(key & 0xFFFFFFFF)), count
@@ -1,4 +1,84 @@
 import math
+from collections import Counter
+from pathlib import Path
+from typing import NamedTuple
+
+
+class Edit(NamedTuple):
+    """Single character edit turning `original` into `edited`.
+
+    `kind` is "insert", "delete", "substitute" or "transpose", and `position`
+    is where the edited characters start in the string the edit applies to.
+    As in the confusion matrices of Kernighan et al. (1990), insertions and
+    deletions include the preceding character ("" at the start of a term),
+    e.g. inserting "x" after "p" is `Edit("insert", i, "p", "px")`.
+    """
+
+    kind: str
+    position: int
+    original: str
+    edited: str
+
+    def shift(self, offset: int) -> "Edit":
+        return self._replace(position=self.position + offset)
+
+
+def align(original: str, edited: str) -> list[Edit]:
+    """Finds the fewest edits turning `original` into `edited`, with
+    insertions, deletions, substitutions and adjacent transpositions
+    (optimal string alignment distance)"""
+    n, m = len(original), len(edited)
+    # d[i][j] is the distance between original[:i] and edited[:j]
+    d = [[max(i, j) if i * j == 0 else 0 for j in range(m + 1)] for i in range(n + 1)]
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            d[i][j] = min(
+                d[i - 1][j] + 1,
+                d[i][j - 1] + 1,
+                d[i - 1][j - 1] + (original[i - 1] != edited[j - 1]),
+            )
+            if (
+                i > 1
+                and j > 1
+                and original[i - 1] == edited[j - 2]
+                and original[i - 2] == edited[j - 1]
+            ):
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+
+    edits = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if (
+            i > 0
+            and j > 0
+            and original[i - 1] == edited[j - 1]
+            and d[i][j] == d[i - 1][j - 1]
+        ):
+            i, j = i - 1, j - 1
+        elif (
+            i > 1
+            and j > 1
+            and original[i - 2 : i] == edited[j - 2 : j][::-1]
+            and d[i][j] == d[i - 2][j - 2] + 1
+        ):
+            edits.append(
+                Edit("transpose", i - 2, original[i - 2 : i], edited[j - 2 : j])
+            )
+            i, j = i - 2, j - 2
+        elif i > 0 and j > 0 and d[i][j] == d[i - 1][j - 1] + 1:
+            edits.append(Edit("substitute", i - 1, original[i - 1], edited[j - 1]))
+            i, j = i - 1, j - 1
+        elif i > 0 and d[i][j] == d[i - 1][j] + 1:
+            prev = original[i - 2 : i - 1]
+            edits.append(
+                Edit("delete", max(i - 2, 0), prev + original[i - 1], prev)
+            )
+            i -= 1
+        else:
+            prev = original[i - 1 : i]
+            edits.append(Edit("insert", max(i - 1, 0), prev, prev + edited[j - 1]))
+            j -= 1
+    return edits[::-1]
 
 
 class BaseEditProbabilityModel:
@@ -23,6 +103,13 @@ class BaseEditProbabilityModel:
         """
         raise NotImplementedError  # Force subclass to implement this method
 
+    def get_edits_logp(self, edited: str, original: str, edits: list[Edit]) -> float:
+        """Same as `get_edit_logp`, given the `edits` turning `original` into
+        `edited` as recorded by `CandidateGenerator`. Models scoring single
+        edits override this to avoid aligning the two strings again.
+        """
+        return self.get_edit_logp(edited, original)
+
 
 class UniformEditProbabilityModel(BaseEditProbabilityModel):
     def __init__(self, edit_prob=0.05):
@@ -57,3 +144,93 @@ class UniformEditProbabilityModel(BaseEditProbabilityModel):
             return math.log(1 - self.edit_prob)
         else:
             return math.log(self.edit_prob)
+
+
+class ConfusionMatrixEditProbabilityModel(BaseEditProbabilityModel):
+    """Noisy channel edit model estimated from (misspelling, correction) pairs.
+
+    Each training pair is aligned with `align`, and the probability of an
+    edit is the number of times its `original` characters were typed as its
+    `edited` characters, over the number of times they occur in the
+    corrections. Counts are add-`smoothing` smoothed. Log-probabilities are
+    precomputed, so scoring takes one table lookup per edit, and edits are
+    assumed independent.
+
+    Attributes
+    ----------
+    edit_counts(Counter): Count of each (original, edited) pair of characters
+    char_counts(Counter): Count of each string of up to two characters in the
+        corrections, "" counting the start of a term
+    """
+
+    def __init__(self, edit_prob: float = 0.05, smoothing: float = 1.0):
+        """
+        Args:
+            edit_prob (float): Probability of a term being edited, used for
+                unedited terms.
+            smoothing (float): Pseudo-count added to every edit.
+        """
+        self.edit_prob = edit_prob
+        self.smoothing = smoothing
+        self.edit_counts = Counter()
+        self.char_counts = Counter()
+        self.fit([])
+
+    @classmethod
+    def from_file(cls, path: str | Path, **kwargs):
+        """Trains a model from a file with one tab-separated
+        "misspelling<TAB>correction" pair per line"""
+        model = cls(**kwargs)
+        with open(path, encoding="utf-8") as f:
+            pairs = [line.rstrip("\n").split("\t") for line in f if "\t" in line]
+        return model.fit(pairs)
+
+    def fit(self, pairs) -> "ConfusionMatrixEditProbabilityModel":
+        """Adds the edits of each (misspelling, correction) pair in `pairs`
+        and recomputes the log-probability tables"""
+        for misspelling, correction in pairs:
+            wrong, right = misspelling.split(), correction.split()
+            if len(wrong) != len(right):
+                # Align whole queries when a space was inserted or deleted
+                wrong, right = [" ".join(wrong)], [" ".join(right)]
+            for raw, term in zip(wrong, right):
+                self.edit_counts.update(
+                    (e.original, e.edited) for e in align(term, raw)
+                )
+                self.char_counts[""] += 1
+                self.char_counts.update(term)
+                self.char_counts.update(a + b for a, b in zip(term, term[1:]))
+
+        alphabet_size = len({c for key in self.char_counts for c in key}) + 1
+        self.unseen_table = {
+            original: math.log(
+                self.smoothing / (count + self.smoothing * alphabet_size)
+            )
+            for original, count in self.char_counts.items()
+        }
+        self.table = {
+            (original, edited): math.log(
+                (count + self.smoothing)
+                / (self.char_counts[original] + self.smoothing * alphabet_size)
+            )
+            for (original, edited), count in self.edit_counts.items()
+        }
+        self._default_logp = math.log(
+            self.smoothing / (1 + self.smoothing * alphabet_size)
+        )
+        return self
+
+    def get_operation_logp(self, edit: Edit) -> float:
+        """Log-probability of `edit.original` being typed as `edit.edited`"""
+        logp = self.table.get((edit.original, edit.edited))
+        if logp is None:
+            logp = self.unseen_table.get(edit.original, self._default_logp)
+        return logp
+
+    def get_edits_logp(self, edited: str, original: str, edits: list[Edit]) -> float:
+        if not edits:
+            return math.log(1 - self.edit_prob)
+        return sum(self.get_operation_logp(edit) for edit in edits)
+
+    def get_edit_logp(self, edited: str, original: str) -> float:
+        return self.get_edits_logp(edited, original, align(original, edited))
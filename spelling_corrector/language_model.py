@@ -2,14 +2,75 @@ import math
 from collections import Counter
 from pathlib import Path
 
-from tqdm import tqdm
+
+def iter_token_lines(file: Path):
+    """Yields the tokens of each line of `file` along with the bigram joining
+    it to the previous non-empty line (None for the first one).
+
+    Carrying the last token over line breaks gives the same unigrams and
+    bigrams as splitting the whole file on whitespace, without holding it
+    in memory.
+    """
+    prev = None
+    with open(file) as f:
+        for line in f:
+            tokens = line.split()
+            if not tokens:
+                continue
+            yield tokens, (prev, tokens[0]) if prev is not None else None
+            prev = tokens[-1]
+
+
+def count_ngrams(files) -> tuple[int, Counter, Counter]:
+    """Counts the tokens, unigrams and bigrams of `files`, streaming the
+    bigrams of each line into the counter instead of building a list.
+
+    Returns:
+        (total_num_tokens, unigram_counts, bigram_counts)
+    """
+    total_num_tokens = 0
+    unigram_counts = Counter()
+    bigram_counts = Counter()
+    for file in files:
+        for tokens, boundary_bigram in iter_token_lines(file):
+            total_num_tokens += len(tokens)
+            unigram_counts.update(tokens)
+            if boundary_bigram is not None:
+                bigram_counts[boundary_bigram] += 1
+            bigram_counts.update(zip(tokens, tokens[1:]))
+    return total_num_tokens, unigram_counts, bigram_counts
+
+
+def count_in_chunks(count, files: list[Path], workers: int = 1):
+    """Yields the partial counts `count(chunk)` of chunks of `files`.
+
+    With a single worker, all the files are counted at once in this process.
+    Otherwise each of `workers` processes counts one interleaved chunk:
+    merging partial counts is the expensive part, so fewer and larger
+    partials are cheaper to combine.
+    """
+    from tqdm import tqdm
+
+    if workers <= 1:
+        yield count(tqdm(files))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    n_chunks = min(len(files), workers)
+    chunks = [files[i::n_chunks] for i in range(n_chunks)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from tqdm(executor.map(count, chunks), total=n_chunks)
 
 
 class LanguageModel:
     """Models prior probability of unigrams and bigrams."""
 
     def __init__(
-        self, corpus_dir: Path = Path("pa2-data/corpus"), lambda_: float = 0.1
+        self,
+        corpus_dir: Path = Path("pa2-data/corpus"),
+        lambda_: float = 0.1,
+        workers: int = 1,
     ):
         """Iterates over all whitespace-separated tokens in each file in
         `corpus_dir`, and counts the number of occurrences of each unigram and
@@ -21,20 +82,30 @@ class LanguageModel:
                 interpolation. You only need to save `lambda_` as an attribute for now, and
                 it will be used later in `LanguageModel.get_bigram_logp`. See Section
                 IV.1.2. below for further explanation.
+            workers (int): Number of processes used to count the corpus. Files
+                are split in chunks, counted in parallel and the partial counts
+                merged. The counts are the same for any number of workers.
         """
         self.lambda_ = lambda_
         self.total_num_tokens = 0  # Counts total number of tokens in the corpus
         self.unigram_counts = Counter()  # Maps strings w_1 -> count(w_1)
         self.bigram_counts = Counter()  # Maps tuples (w_1, w_2) -> count((w_1, w_2))
 
-        for file in tqdm(corpus_dir.iterdir()):
-            tokens = file.read_text().split()
-            unigrams = tokens
-            bigrams = [(tokens[i], tokens[i + 1]) for i in range(len(tokens) - 1)]
-
-            self.total_num_tokens += len(tokens)
-            self.unigram_counts.update(unigrams)
-            self.bigram_counts.update(bigrams)
+        files = sorted(corpus_dir.iterdir())
+        for counts in count_in_chunks(count_ngrams, files, workers):
+            self._add_counts(counts)
+
+    def _add_counts(self, counts: tuple[int, Counter, Counter]):
+        """Merges partial counts as returned by `count_ngrams`"""
+        total_num_tokens, unigram_counts, bigram_counts = counts
+        self.total_num_tokens += total_num_tokens
+        if not self.unigram_counts:
+            # Adopt the first partial counts instead of copying them
+            self.unigram_counts = unigram_counts
+            self.bigram_counts = bigram_counts
+            return
+        self.unigram_counts.update(unigram_counts)
+        self.bigram_counts.update(bigram_counts)
 
     def get_unigram_logp(self, unigram: str) -> float:
         """Computes the log-probability of `unigram` under this `LanguageModel`.
@@ -0,0 +1,193 @@
+from collections import OrderedDict
+
+from .candidate_generator import CandidateGenerator
+from .edit_probability_model import BaseEditProbabilityModel, Edit
+from .language_model import LanguageModel
+
+
+class LRUCache:
+    """Bounded mapping evicting the least recently used entries.
+
+    Keeps hit, miss and eviction counts so the cache size can be tuned.
+    """
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def lookup(self, key, compute):
+        """Returns the cached value of `key`, calling `compute()` to fill it
+        on a miss"""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            value = compute()
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return value
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def clear(self):
+        """Drops every entry. Counters are kept, see `reset_stats`"""
+        self._data.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CachedLanguageModel(LanguageModel):
+    """Memoizes the log-probabilities of a language model.
+
+    Wraps a `LanguageModel` (or any model with the same interface) and caches
+    `get_unigram_logp` and `get_bigram_logp`, which the inherited
+    `get_query_logp` combines. Other attributes are read from the wrapped
+    model. The bigram cache is cleared whenever `lambda_` changes,
+    and both caches when the wrapped model is replaced.
+    """
+
+    def __init__(self, lm, maxsize: int = 100_000):
+        self.unigram_cache = LRUCache(maxsize)
+        self.bigram_cache = LRUCache(maxsize)
+        self.lm = lm
+
+    @property
+    def lm(self):
+        return self._lm
+
+    @lm.setter
+    def lm(self, lm):
+        self._lm = lm
+        self._lambda = lm.lambda_
+        self.unigram_cache.clear()
+        self.bigram_cache.clear()
+
+    @property
+    def lambda_(self) -> float:
+        return self._lm.lambda_
+
+    @lambda_.setter
+    def lambda_(self, lambda_: float):
+        self._lm.lambda_ = lambda_
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined here, e.g. unigram_counts
+        if name == "_lm":
+            raise AttributeError(name)
+        return getattr(self._lm, name)
+
+    def get_unigram_logp(self, unigram: str) -> float:
+        return self.unigram_cache.lookup(
+            unigram, lambda: self._lm.get_unigram_logp(unigram)
+        )
+
+    def get_bigram_logp(self, w_1: str, w_2: str) -> float:
+        if self._lm.lambda_ != self._lambda:
+            self._lambda = self._lm.lambda_
+            self.bigram_cache.clear()
+        return self.bigram_cache.lookup(
+            (w_1, w_2), lambda: self._lm.get_bigram_logp(w_1, w_2)
+        )
+
+    def cache_stats(self) -> dict:
+        return {
+            "unigram": self.unigram_cache.stats(),
+            "bigram": self.bigram_cache.stats(),
+        }
+
+
+class CachedEditProbabilityModel(BaseEditProbabilityModel):
+    """Memoizes `get_edit_logp` of an edit probability model.
+
+    Call `clear` after changing the parameters of the wrapped model; the
+    cache is cleared automatically when the wrapped model is replaced.
+    """
+
+    def __init__(self, epm: BaseEditProbabilityModel, maxsize: int = 100_000):
+        self.cache = LRUCache(maxsize)
+        self.epm = epm
+
+    @property
+    def epm(self) -> BaseEditProbabilityModel:
+        return self._epm
+
+    @epm.setter
+    def epm(self, epm: BaseEditProbabilityModel):
+        self._epm = epm
+        self.cache.clear()
+
+    def __getattr__(self, name):
+        if name == "_epm":
+            raise AttributeError(name)
+        return getattr(self._epm, name)
+
+    def get_edit_logp(self, edited: str, original: str) -> float:
+        return self.cache.lookup(
+            (edited, original), lambda: self._epm.get_edit_logp(edited, original)
+        )
+
+    def get_edits_logp(self, edited: str, original: str, edits: list[Edit]) -> float:
+        # The same strings can be reached through different edits, which
+        # models scoring single edits score differently
+        return self.cache.lookup(
+            (edited, original, tuple(edits)),
+            lambda: self._epm.get_edits_logp(edited, original, edits),
+        )
+
+    def clear(self):
+        self.cache.clear()
+
+
+class CachedCandidateGenerator(CandidateGenerator):
+    """`CandidateGenerator` memoizing the filtered edits of each term.
+
+    The cache is cleared when `lm` is replaced, since the candidates depend
+    on its vocabulary.
+    """
+
+    def __init__(
+        self, lm, epm, candidate_index=None, stats=None, maxsize: int = 100_000
+    ):
+        self.edit1_cache = LRUCache(maxsize)
+        super().__init__(lm, epm, candidate_index, stats)
+
+    @property
+    def lm(self):
+        return self._lm
+
+    @lm.setter
+    def lm(self, lm):
+        self._lm = lm
+        self.edit1_cache.clear()
+
+    def generate_edit1_ops(self, term: str) -> list[tuple[str, Edit]]:
+        """Cached `CandidateGenerator.generate_edit1_ops`. The returned list is
+        shared between calls and must not be modified"""
+        generate_edit1_ops = super().generate_edit1_ops
+        return self.edit1_cache.lookup(term, lambda: generate_edit1_ops(term))
+
+    def cache_stats(self) -> dict:
+        return {"edit1": self.edit1_cache.stats()}
@@ -1,7 +1,24 @@
-import numpy as np
+import heapq
+import math
+import time
 
 from .candidate_generator import CandidateGenerator
+from .compact_language_model import CompactLanguageModel
 from .language_model import LanguageModel
+from .stats import CorrectionStats
+
+
+# Scorer used by the worker processes of `CandidateScorer.correct_many`
+_worker_scorer = None
+
+
+def _init_worker(scorer: "CandidateScorer"):
+    global _worker_scorer
+    _worker_scorer = scorer
+
+
+def _correct_spelling(raw: str) -> str:
+    return _worker_scorer.correct_spelling(raw)
 
 
 class CandidateScorer:
@@ -22,6 +39,28 @@ class CandidateScorer:
         self.lm = lm
         self.cg = cg
         self.mu = mu
+        self.stats = None
+
+    @property
+    def lm(self):
+        return self._lm
+
+    @lm.setter
+    def lm(self, lm):
+        self._lm = lm
+        # Rebuilt from the new model on the next batched scoring
+        self._compact_lm = None
+
+    def enable_stats(self) -> CorrectionStats:
+        """Starts recording the work done by each stage of correction, in
+        stats shared with the candidate generator"""
+        self.stats = CorrectionStats()
+        self.cg.stats = self.stats
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+        self.cg.stats = None
 
     def get_score(self, query: str, log_edit_prob: float) -> float:
         """Computes the final score for a candidate using bayes theorem.
@@ -43,9 +82,270 @@ class CandidateScorer:
         Returns:
             q (str): Spell-corrected query. That is, the query that maximizes
                 P(R|Q)*P(Q) under the language model and edit probability model,
-                restricted to Q's generated by the candidate generator.
+                restricted to Q's generated by the candidate generator. `raw`
+                is returned unchanged if there are no candidates.
         """
-        
+        import numpy as np
+
+        start = time.perf_counter()
         candidates = list(self.cg.get_candidates(raw))
+        generated = time.perf_counter()
         score = [self.get_score(query, log_edit_prob) for query, log_edit_prob in candidates]
+        if self.stats is not None:
+            end = time.perf_counter()
+            self.stats.queries += 1
+            self.stats.candidate_time += generated - start
+            self.stats.scoring_time += end - generated
+            self.stats.total_time += end - start
+        if not candidates:
+            return raw
         return candidates[np.argmax(score)][0] # Get the query with max score
+
+    def correct_spelling_timed(
+        self, raw: str, timeout: float, confidence_logp: float | None = None
+    ) -> tuple[str, bool]:
+        """Corrects spelling of `raw` within a time budget.
+
+        If every term of `raw` is in vocabulary and its average log-probability
+        per term is at least `confidence_logp`, `raw` is returned without
+        generating candidates. Otherwise candidates are scored as they are
+        generated, one edit away first, and the best one found is returned
+        once `timeout` seconds have passed.
+
+        Args:
+            raw (str): Raw input query from the user.
+            timeout (float): Time budget in seconds.
+            confidence_logp (float): Average log-probability per term above
+                which in-vocabulary queries are accepted as they are. None to
+                always search for candidates.
+
+        Returns:
+            Tuple (q, completed) of the spell-corrected query, `raw` if no
+                candidate was found, and whether every candidate was scored
+                before the deadline.
+        """
+        start = time.perf_counter()
+        deadline = start + timeout
+        terms = raw.split()
+        if (
+            confidence_logp is not None
+            and terms
+            and self.cg.get_num_oov(raw) == 0
+            and self.lm.get_query_logp(raw) / len(terms) >= confidence_logp
+        ):
+            return raw, True
+
+        best, best_score = raw, -math.inf
+        for query, log_edit_prob in self.cg.get_candidates(raw, deadline):
+            score = self.get_score(query, log_edit_prob)
+            if score > best_score:
+                best, best_score = query, score
+            if time.perf_counter() >= deadline:
+                break
+        end = time.perf_counter()
+        if self.stats is not None:
+            self.stats.queries += 1
+            self.stats.total_time += end - start
+        # A generator stopped by the deadline is indistinguishable from an
+        # exhausted one, so a search finishing exactly at the deadline is
+        # reported as incomplete
+        return best, end < deadline
+
+    def correct_many(
+        self, queries: list[str], workers: int = 1, chunksize: int = 64
+    ) -> list[str]:
+        """Corrects the spelling of many queries, in parallel if `workers` > 1.
+
+        Identical queries are only corrected once, and the corrections are
+        returned in the order of `queries`.
+
+        Where processes are started by forking, the workers share the
+        language model and candidate index of this scorer copy-on-write, so
+        nothing but the queries is pickled. Otherwise the scorer is sent once
+        to each worker when it starts.
+
+        Args:
+            queries (List[str]): Raw queries.
+            workers (int): Number of processes.
+            chunksize (int): Number of queries sent to a worker at a time.
+
+        Returns:
+            List[str]: Spell-corrected query for each of `queries`.
+        """
+        global _worker_scorer
+
+        unique = list(dict.fromkeys(queries))
+        if workers <= 1:
+            corrections = {raw: self.correct_spelling(raw) for raw in unique}
+            return [corrections[raw] for raw in queries]
+
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        if "fork" in multiprocessing.get_all_start_methods():
+            # Forked workers inherit the scorer set here
+            context = multiprocessing.get_context("fork")
+            _worker_scorer = self
+            initializer, initargs = None, ()
+        else:
+            context = multiprocessing.get_context()
+            initializer, initargs = _init_worker, (self,)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=initializer,
+                initargs=initargs,
+            ) as executor:
+                results = executor.map(_correct_spelling, unique, chunksize=chunksize)
+                corrections = dict(zip(unique, results))
+        finally:
+            _worker_scorer = None
+        return [corrections[raw] for raw in queries]
+
+    def _get_compact_lm(self) -> CompactLanguageModel:
+        """Array-backed version of `self.lm`, built on first use"""
+        if isinstance(self.lm, CompactLanguageModel):
+            return self.lm
+        if not hasattr(self.lm.bigram_counts, "items"):
+            raise TypeError(
+                f"Batched scoring needs exact bigram counts, which "
+                f"{type(self.lm).__name__} does not store"
+            )
+        if self._compact_lm is None:
+            self._compact_lm = CompactLanguageModel.from_language_model(self.lm)
+        self._compact_lm.lambda_ = self.lm.lambda_
+        return self._compact_lm
+
+    def correct_spelling_topk(
+        self, raw: str, k: int = 5, batch_size: int = 1024
+    ) -> list[tuple[str, float]]:
+        """Scores the candidates of `raw` in batches and keeps the `k` best.
+
+        Candidates are consumed from the generator `batch_size` at a time,
+        converted to arrays of word ids and scored with the vectorized
+        `CompactLanguageModel.batch_query_logp`. Since P(Q) <= 1, a candidate
+        whose edit log-probability is already below the k-th best score
+        cannot enter the top k and is skipped without being scored.
+
+        Returns:
+            List of up to `k` (query, score) pairs by decreasing score, e.g.
+                for "did you mean" suggestions.
+
+        Raises:
+            TypeError: If `self.lm` does not store exact bigram counts, as
+                `ApproximateLanguageModel`.
+        """
+        import numpy as np
+
+        compact_lm = self._get_compact_lm()
+        word_ids = {}
+        top = []  # Min-heap of the k best (score, query)
+        # Scores of the queries in `top`. The generator can yield a candidate
+        # more than once, which only matters if it is in the top k
+        top_scores = {}
+
+        def score_batch(batch):
+            by_length = {}
+            for query, log_edit_prob in batch:
+                by_length.setdefault(len(query.split()), []).append(
+                    (query, log_edit_prob)
+                )
+            for group in by_length.values():
+                ids = []
+                for query, _ in group:
+                    for t in query.split():
+                        if t not in word_ids:
+                            word_ids[t] = compact_lm.word_id(t)
+                    ids.append([word_ids[t] for t in query.split()])
+                edit_logps = np.array([lp for _, lp in group])
+                scores = edit_logps + self.mu * compact_lm.batch_query_logp(ids)
+                for (query, _), score in zip(group, scores.tolist()):
+                    if query in top_scores:
+                        if score <= top_scores[query]:
+                            continue
+                        top.remove((top_scores[query], query))
+                        heapq.heapify(top)
+                    if len(top) < k:
+                        heapq.heappush(top, (score, query))
+                    elif score > top[0][0]:
+                        _, evicted = heapq.heapreplace(top, (score, query))
+                        del top_scores[evicted]
+                    else:
+                        continue
+                    top_scores[query] = score
+
+        batch = []
+        for query, log_edit_prob in self.cg.get_candidates(raw):
+            if len(top) == k and self.mu >= 0 and log_edit_prob <= top[0][0]:
+                continue
+            batch.append((query, log_edit_prob))
+            if len(batch) == batch_size:
+                score_batch(batch)
+                batch = []
+        if batch:
+            score_batch(batch)
+        return [(query, score) for score, query in sorted(top, reverse=True)]
+
+    def correct_spelling_lattice(
+        self, raw: str, beam_width: int = 32, max_edits: int = 2
+    ) -> str:
+        """Corrects spelling of `raw` by searching a lattice of per-term
+        candidates instead of enumerating whole candidate queries.
+
+        Position i of the lattice holds the candidates of the i-th term (see
+        `CandidateGenerator.get_term_candidates`). A beam search over the
+        bigram `LanguageModel` keeps, at each position, the `beam_width` best
+        partial queries per (last word, edits used) state, with at most
+        `max_edits` edits in total. The cost is linear in the query length.
+
+        Edit log-probabilities are summed term by term, so every kept term
+        contributes `get_edit_logp(term, term)`.
+
+        Returns:
+            q (str): Spell-corrected query. `raw` is returned unchanged if some
+                term has no in-vocabulary candidate.
+        """
+        terms = raw.strip().split()
+        lattice = [self.cg.get_term_candidates(term) for term in terms]
+        if not terms or not all(lattice):
+            return raw
+
+        bigram_logps = {}
+
+        def bigram_logp(w_1, w_2):
+            if (w_1, w_2) not in bigram_logps:
+                bigram_logps[(w_1, w_2)] = self.lm.get_bigram_logp(w_1, w_2)
+            return bigram_logps[(w_1, w_2)]
+
+        # Each state (word, edits) maps to (score, previous state)
+        beam = {}
+        for word, (n_edits, edit_logp) in lattice[0].items():
+            if n_edits <= max_edits:
+                score = edit_logp + self.mu * self.lm.get_unigram_logp(word)
+                beam[(word, n_edits)] = (score, None)
+        backpointers = [beam]
+        for candidates in lattice[1:]:
+            states = {}
+            for (prev, used), (prev_score, _) in beam.items():
+                for word, (n_edits, edit_logp) in candidates.items():
+                    if used + n_edits > max_edits:
+                        continue
+                    score = (
+                        prev_score + edit_logp + self.mu * bigram_logp(prev, word)
+                    )
+                    state = (word, used + n_edits)
+                    if state not in states or score > states[state][0]:
+                        states[state] = (score, (prev, used))
+            if not states:
+                return raw
+            best = sorted(states, key=lambda s: states[s][0], reverse=True)
+            beam = {state: states[state] for state in best[:beam_width]}
+            backpointers.append(beam)
+
+        state = max(beam, key=lambda s: beam[s][0])
+        corrected = []
+        for states in reversed(backpointers):
+            corrected.append(state[0])
+            state = states[state][1]
+        return " ".join(reversed(corrected))
@@ -0,0 +1,83 @@
+from collections import Counter
+
+
+class CorrectionStats:
+    """Counters of the work done by spelling correction.
+
+    Enable them with `CandidateScorer.enable_stats`, which shares one
+    instance with the candidate generator. Without stats, the generator skips
+    all the per-candidate bookkeeping.
+
+    Attributes
+    ----------
+    queries: int
+        Number of corrected queries
+    generated: Counter
+        Candidate queries produced by `get_candidates`, by number of edits.
+        Two single edits of different terms count as 2 edits
+    yielded: Counter
+        Candidates, by number of edits, that passed `filter_and_yield`
+    vocabulary_lookups: int
+        Number of terms looked up by `get_num_oov`
+    generation_time: float
+        Seconds spent enumerating the edits of the query terms
+    filter_time: float
+        Seconds spent filtering out-of-vocabulary candidates
+    candidate_time: float
+        Seconds spent producing the candidates, including the two stages
+        above and the edit log-probabilities
+    scoring_time: float
+        Seconds spent scoring candidates with the language model
+    total_time: float
+        Seconds spent correcting queries
+    """
+
+    fields = (
+        "queries",
+        "generated",
+        "yielded",
+        "vocabulary_lookups",
+        "generation_time",
+        "filter_time",
+        "candidate_time",
+        "scoring_time",
+        "total_time",
+    )
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.generated = Counter()
+        self.yielded = Counter()
+        self.vocabulary_lookups = 0
+        self.generation_time = 0.0
+        self.filter_time = 0.0
+        self.candidate_time = 0.0
+        self.scoring_time = 0.0
+        self.total_time = 0.0
+
+    def add(self, other: "CorrectionStats"):
+        """Accumulates the counters of `other` into these stats"""
+        for field in self.fields:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def yield_ratios(self) -> dict[int, float]:
+        """Fraction of the generated candidates that were yielded, by number
+        of edits"""
+        return {
+            num_edits: self.yielded[num_edits] / count
+            for num_edits, count in sorted(self.generated.items())
+        }
+
+    def as_dict(self) -> dict:
+        stats = {field: getattr(self, field) for field in self.fields}
+        stats["generated"] = dict(sorted(self.generated.items()))
+        stats["yielded"] = dict(sorted(self.yielded.items()))
+        stats["yield_ratios"] = self.yield_ratios()
+        return stats
+
+    def __repr__(self) -> str:
+        counters = ", ".join(f"{k}={v}" for k, v in self.as_dict().items())
+        return f"CorrectionStats({counters})"
@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from .edit_probability_model import Edit
+
+
+def deletes(term: str) -> set[str]:
+    """Returns every string obtained by deleting one character of `term`"""
+    return {term[:i] + term[i + 1 :] for i in range(len(term))}
+
+
+class SymmetricDeleteIndex:
+    """SymSpell-style index from deletion variants to vocabulary words.
+
+    Every vocabulary word is indexed under itself and each of its one
+    character deletions. Two words at most one insertion, deletion,
+    substitution or adjacent transposition apart always share one of these
+    keys, so the vocabulary words one edit away from a term are found by
+    probing the term and its deletions. Probed words are then verified with
+    the same edit rules (and alphabet) as `CandidateGenerator.generate_edit1`.
+
+    Edits of distance 2 are obtained, as in `CandidateGenerator.get_candidates`,
+    by applying `edit1` to the distance 1 words.
+    """
+
+    def __init__(self, vocabulary, alphabet):
+        """
+        Args:
+            vocabulary (Iterable[str]): Words that can be returned as candidates,
+                e.g. `LanguageModel.unigram_counts`.
+            alphabet (Iterable[str]): Characters allowed in insertions and
+                substitutions.
+        """
+        self.alphabet = frozenset(alphabet)
+        self.index = defaultdict(list)
+        for word in vocabulary:
+            self.index[word].append(word)
+            for variant in deletes(word):
+                self.index[variant].append(word)
+        self.index = dict(self.index)
+
+    def edit1(self, term: str) -> list[str]:
+        """Vocabulary words one edit away from `term`, excluding `term`"""
+        return [candidate for candidate, _ in self.edit1_ops(term)]
+
+    def edit1_ops(self, term: str) -> list[tuple[str, Edit]]:
+        """Vocabulary words one edit away from `term`, excluding `term`, each
+        with the `Edit` turning it back into `term` (see `is_edit1`)"""
+        candidates = set()
+        for key in deletes(term) | {term}:
+            candidates.update(self.index.get(key, ()))
+        candidates.discard(term)
+        return [
+            (candidate, edit)
+            for candidate in candidates
+            if (edit := self.is_edit1(candidate, term)) is not None
+        ]
+
+    def is_edit1(self, edited: str, original: str) -> Edit | None:
+        """Checks whether `edited` is one deletion, adjacent transposition, or
+        insertion/substitution of an alphabet character away from `original`.
+
+        Returns:
+            The `Edit` turning `edited` back into `original`, as recorded by
+                `CandidateGenerator.generate_edit1_ops`, or None. Edits within
+                runs of a repeated character are placed at the leftmost
+                position, as in `align`.
+        """
+        len_edited, len_original = len(edited), len(original)
+        if len_edited == len_original - 1:
+            # The first match is the leftmost position in runs
+            for i in range(len_original):
+                if original[:i] + original[i + 1 :] == edited:
+                    prev = original[i - 1 : i]
+                    return Edit("insert", max(i - 1, 0), prev, prev + original[i])
+            return None
+        if len_edited == len_original + 1:
+            for i in range(len_edited):
+                if edited[:i] + edited[i + 1 :] == original:
+                    if edited[i] not in self.alphabet:
+                        return None
+                    prev = edited[i - 1 : i]
+                    return Edit("delete", max(i - 1, 0), prev + edited[i], prev)
+            return None
+        if len_edited != len_original:
+            return None
+
+        diffs = [i for i in range(len_original) if edited[i] != original[i]]
+        if len(diffs) == 1:
+            i = diffs[0]
+            if edited[i] not in self.alphabet:
+                return None
+            return Edit("substitute", i, edited[i], original[i])
+        if len(diffs) == 2:
+            i, j = diffs
+            if j == i + 1 and edited[i] == original[j] and edited[j] == original[i]:
+                return Edit("transpose", i, edited[i : i + 2], original[i : i + 2])
+        return None
@@ -0,0 +1,88 @@
+import array
+import pickle as pkl
+from collections import Counter
+from pathlib import Path
+
+from .count_views import BigramCounts, UnigramCounts
+from .language_model import LanguageModel
+
+
+class TermIdLanguageModel(LanguageModel):
+    """`LanguageModel` whose counts are keyed by the ids of a term dictionary
+    shared with an index, e.g. `BSBIIndex.term_id_map`.
+
+    Words are only stored once, in the term dictionary. Unigram counts are an
+    array indexed by term id and bigram counts a `Counter` of packed
+    `id_1 << 32 | id_2` keys. `unigram_counts` and `bigram_counts` are
+    read-only views by word, so the model can be used wherever a
+    `LanguageModel` is expected. Terms added to the dictionary after the
+    counts were taken, such as unknown query terms, are out of vocabulary.
+    """
+
+    def __init__(self, term_id_map, lambda_: float = 0.1):
+        """
+        Args:
+            term_id_map (IdMap): Term dictionary mapping words to ids, through
+                its `str_to_id` dict and `id_to_str` list.
+            lambda_ (float): Interpolation factor for smoothing by unigram-bigram
+                interpolation.
+        """
+        self.term_id_map = term_id_map
+        self.lambda_ = lambda_
+        self.total_num_tokens = 0
+        self.unigram_array = array.array("Q")
+        self.bigram_ids = Counter()
+        # Number of terms with a non-zero count
+        self.num_words = 0
+        self.unigram_counts = UnigramCounts(self)
+        self.bigram_counts = BigramCounts(self)
+
+    @property
+    def num_bigrams(self) -> int:
+        return len(self.bigram_ids)
+
+    def word_id(self, word: str) -> int | None:
+        """Returns the id of `word`, None if it was not counted. Unlike
+        `IdMap.__getitem__`, unknown words are not added to the dictionary"""
+        term_id = self.term_id_map.str_to_id.get(word)
+        if term_id is None or term_id >= len(self.unigram_array):
+            return None
+        return term_id
+
+    def word(self, term_id: int) -> str:
+        return self.term_id_map.id_to_str[term_id]
+
+    def packed_bigram_count(self, key: int) -> int:
+        return self.bigram_ids[key]
+
+    def packed_bigram_items(self):
+        return self.bigram_ids.items()
+
+    def add_tokens(self, token_ids: list[int]):
+        """Counts the unigrams and bigrams of a document given as term ids"""
+        self.total_num_tokens += len(token_ids)
+        missing = max(token_ids, default=-1) + 1 - len(self.unigram_array)
+        if missing > 0:
+            self.unigram_array.extend([0] * missing)
+        unigram_array = self.unigram_array
+        for term_id in token_ids:
+            if not unigram_array[term_id]:
+                self.num_words += 1
+            unigram_array[term_id] += 1
+        self.bigram_ids.update(
+            id_1 << 32 | id_2 for id_1, id_2 in zip(token_ids, token_ids[1:])
+        )
+
+    def save(self, path: str | Path):
+        """Pickles the counts, without the term dictionary"""
+        with open(path, "wb") as f:
+            pkl.dump([self.total_num_tokens, self.unigram_array, self.bigram_ids], f)
+
+    @classmethod
+    def load(cls, path: str | Path, term_id_map, lambda_: float = 0.1):
+        """Loads counts saved by `save`, keyed by `term_id_map`"""
+        lm = cls(term_id_map, lambda_)
+        with open(path, "rb") as f:
+            lm.total_num_tokens, lm.unigram_array, lm.bigram_ids = pkl.load(f)
+        lm.num_words = len(lm.unigram_array) - lm.unigram_array.count(0)
+        return lm
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+
+from BSBI.async_search import AsyncSearcher
+from BSBI.BSBI import BSBIIndex
+
+
+@pytest.fixture
+def index(tmp_path, tmp_path_factory):
+    block_dir = tmp_path / "block1"
+    block_dir.mkdir()
+    (block_dir / "doc1.txt").write_text("hello world")
+    (block_dir / "doc2.txt").write_text("hello python")
+    output_dir = tmp_path_factory.mktemp("output")
+    BSBIIndex(data_dir=tmp_path, output_dir=output_dir).index()
+    return BSBIIndex(data_dir=tmp_path, output_dir=output_dir)
+
+
+def test_aretrieve_coalesces_duplicates(index):
+    calls = []
+    retrieve = index.retrieve
+
+    def slow_retrieve(query):
+        calls.append(query)
+        time.sleep(0.05)
+        return retrieve(query)
+
+    index.retrieve = slow_retrieve
+
+    async def run():
+        searcher = AsyncSearcher(index, max_concurrency=2)
+        results = await asyncio.gather(
+            searcher.aretrieve("hello"),
+            searcher.aretrieve("hello "),
+            searcher.aretrieve("python"),
+        )
+        searcher.close()
+        return results
+
+    results = asyncio.run(run())
+    assert results[0] == results[1] == ["block1/doc1.txt", "block1/doc2.txt"]
+    assert results[2] == ["block1/doc2.txt"]
+    assert sorted(calls) == ["hello", "python"]
+
+
+def test_aretrieve_timeout(index):
+    index.load()
+    index.retrieve = lambda query: time.sleep(0.2) or []
+
+    async def run():
+        searcher = AsyncSearcher(index, timeout=0.01)
+        try:
+            with pytest.raises(TimeoutError):
+                await searcher.aretrieve("hello")
+        finally:
+            searcher.close()
+
+    asyncio.run(run())
+
+
+def test_aretrieve_retry_after_timeout(index):
+    index.load()
+    retrieve = index.retrieve
+
+    def slow_retrieve(query):
+        time.sleep(0.3)
+        return retrieve(query)
+
+    index.retrieve = slow_retrieve
+
+    async def run():
+        searcher = AsyncSearcher(index)
+        try:
+            with pytest.raises(TimeoutError):
+                await searcher.aretrieve("hello", timeout=0.05)
+            return await searcher.aretrieve("hello", timeout=2)
+        finally:
+            searcher.close()
+
+    assert asyncio.run(run()) == ["block1/doc1.txt", "block1/doc2.txt"]
+
+
+def test_aretrieve_stats(index):
+    queries = ["hello", "world", "python", "hello python", "hello world", "missing"]
+    hooked = {}
+    index.enable_stats(hook=lambda query, stats: hooked.setdefault(query, stats))
+
+    async def run():
+        searcher = AsyncSearcher(index, max_concurrency=len(queries))
+        await asyncio.gather(*(searcher.aretrieve(query) for query in queries))
+        searcher.close()
+
+    asyncio.run(run())
+    assert sorted(hooked) == sorted(queries)
+    assert hooked["hello python"].lookups == 2
+    assert index.stats.lookups == sum(stats.lookups for stats in hooked.values())
+    assert index.stats.postings_decoded == sum(
+        stats.postings_decoded for stats in hooked.values()
+    )
@@ -0,0 +1,45 @@
+from BSBI.bitmap import RoaringBitmap
+from BSBI.postings import HybridPostings
+from BSBI.utils import intersect_arrays, intersect_postings, sorted_intersect
+
+
+def test_bitmap_roundtrip():
+    postings = list(range(0, 200_000, 3)) + [300_000, 300_001]
+    bitmap = RoaringBitmap.from_list(postings)
+    assert len(bitmap) == len(postings)
+    assert bitmap.tolist() == postings
+    assert RoaringBitmap.from_bytes(bitmap.to_bytes()).tolist() == postings
+
+
+def test_bitmap_intersections():
+    dense1 = list(range(0, 100_000, 2))
+    dense2 = list(range(0, 100_000, 3))
+    sparse = [1, 6, 7, 12, 99_996, 150_000]
+    expected = sorted_intersect(dense1, dense2)
+
+    bitmap1 = RoaringBitmap.from_list(dense1)
+    bitmap2 = RoaringBitmap.from_list(dense2)
+    assert intersect_postings(bitmap1, bitmap2).tolist() == expected
+    assert intersect_postings(sparse, bitmap1) == sorted_intersect(sparse, dense1)
+    assert intersect_postings(bitmap2, sparse) == sorted_intersect(sparse, dense2)
+
+
+def test_hybrid_postings():
+    dense = list(range(0, 20_000, 2))
+    sparse = [5, 500, 5000]
+    assert isinstance(HybridPostings.decode(HybridPostings.encode(dense)), RoaringBitmap)
+    assert list(HybridPostings.decode(HybridPostings.encode(dense))) == dense
+    assert HybridPostings.decode(HybridPostings.encode(sparse)) == sparse
+    # Short lists of small docIDs stay lists
+    for short in ([0], [3], [10], list(range(1000))):
+        assert HybridPostings.decode(HybridPostings.encode(short)) == short
+
+
+def test_intersect_arrays():
+    import numpy as np
+
+    list1 = list(range(0, 1000, 2))
+    list2 = [1, 2, 3, 4, 998, 999, 1500]
+    result = intersect_arrays(np.array(list1), np.array(list2))
+    assert result.tolist() == sorted_intersect(list1, list2)
+    assert intersect_arrays(np.array([5]), np.array([], dtype=int)).tolist() == []
@@ -3,6 +3,9 @@ from pathlib import Path
 import pytest
 
 from BSBI.BSBI import BSBIIndex
+from BSBI.postings import CompressedPostings
+from BSBI.spelling import SpellingIndex
+from BSBI.utils import MappedIdMap
 
 
 @pytest.fixture
@@ -21,6 +24,22 @@ def temp_block_dir(tmp_path):
 def bsbi_index(tmp_path, temp_block_dir):
     return BSBIIndex(data_dir=tmp_path, output_dir=tmp_path)
 
+
+@pytest.fixture
+def indexed_output_dir(request, tmp_path, tmp_path_factory, temp_block_dir):
+    """Output directory of an index of `temp_block_dir`. Indirect
+    parametrization can pass a dict with the `index_class` and
+    `postings_encoding` of the index and keyword arguments of its `index`"""
+    output_dir = tmp_path_factory.mktemp("output")
+    options = dict(getattr(request, "param", {}))
+    index_class = options.pop("index_class", BSBIIndex)
+    postings_encoding = options.pop("postings_encoding", None)
+    index_class(
+        data_dir=tmp_path, output_dir=output_dir, postings_encoding=postings_encoding
+    ).index(**options)
+    return output_dir
+
+
 def test_parse_block(bsbi_index, temp_block_dir):
     # Call parse_block
     result = bsbi_index.parse_block(temp_block_dir)
@@ -37,4 +56,176 @@ def test_parse_block(bsbi_index, temp_block_dir):
     assert terms == {"hello", "world", "python", "of"}
     
     # Check for duplicate tuples
-    assert len(result) == len(set(result)), "Duplicate tuples found in the result"
\ No newline at end of file
+    assert len(result) == len(set(result)), "Duplicate tuples found in the result"
+
+
+def test_lazy_retrieve(tmp_path, indexed_output_dir):
+    output_dir = indexed_output_dir
+    eager = BSBIIndex(data_dir=tmp_path, output_dir=output_dir)
+    lazy = BSBIIndex(data_dir=tmp_path, output_dir=output_dir, lazy_load=True)
+
+    assert lazy.retrieve("unknown") == []
+    assert len(lazy.doc_id_map) == 0, "Doc map loaded for an empty result"
+    assert lazy.retrieve("hello python") == eager.retrieve("hello python")
+    assert isinstance(lazy.doc_id_map, MappedIdMap)
+
+
+def test_parallel_merge(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("data")
+    for block in range(3):
+        block_dir = data_dir / str(block)
+        block_dir.mkdir()
+        for doc in range(4):
+            words = [f"w{(block * 7 + doc * i) % 11}" for i in range(6)]
+            (block_dir / f"doc{doc}.txt").write_text(" ".join(words))
+
+    serial_dir = tmp_path_factory.mktemp("serial")
+    parallel_dir = tmp_path_factory.mktemp("parallel")
+    BSBIIndex(data_dir=data_dir, output_dir=serial_dir).index()
+    BSBIIndex(data_dir=data_dir, output_dir=parallel_dir).index(merge_workers=3)
+
+    serial = BSBIIndex(data_dir=data_dir, output_dir=serial_dir)
+    parallel = BSBIIndex(data_dir=data_dir, output_dir=parallel_dir)
+    for i in range(11):
+        assert parallel.retrieve(f"w{i}") == serial.retrieve(f"w{i}")
+    assert (parallel_dir / "BSBI.index").read_bytes() == (
+        serial_dir / "BSBI.index"
+    ).read_bytes()
+    assert not list(parallel_dir.glob("*.part*"))
+
+
+@pytest.mark.parametrize(
+    "indexed_output_dir", [{"postings_encoding": CompressedPostings}], indirect=True
+)
+def test_array_retrieve(tmp_path, indexed_output_dir):
+    output_dir = indexed_output_dir
+    lists = BSBIIndex(
+        data_dir=tmp_path, output_dir=output_dir, postings_encoding=CompressedPostings
+    )
+    arrays = BSBIIndex(
+        data_dir=tmp_path,
+        output_dir=output_dir,
+        postings_encoding=CompressedPostings,
+        use_arrays=True,
+    )
+    for query in ["hello", "hello world", "python world", "of hello", "missing"]:
+        assert arrays.retrieve(query) == lists.retrieve(query)
+
+
+def test_wildcard_retrieve(tmp_path, indexed_output_dir):
+    output_dir = indexed_output_dir
+    for use_arrays in (False, True):
+        index = BSBIIndex(
+            data_dir=tmp_path, output_dir=output_dir, use_arrays=use_arrays
+        )
+        assert index.retrieve("hel*") == index.retrieve("hello")
+        assert index.retrieve("*orld python") == ["block1/doc3.txt"]
+        assert index.retrieve("*o* hello") == ["block1/doc1.txt", "block1/doc2.txt"]
+        assert index.retrieve("xyz*") == []
+
+
+@pytest.mark.parametrize(
+    "indexed_output_dir",
+    [
+        {
+            "tier_size": 1,
+            "static_score": {
+                "block1/doc1.txt": 1.0,
+                "block1/doc2.txt": 3.0,
+                "block1/doc3.txt": 2.0,
+            }.__getitem__,
+        }
+    ],
+    indirect=True,
+)
+def test_retrieve_top_k(tmp_path, temp_block_dir, indexed_output_dir):
+    output_dir = indexed_output_dir
+    index = BSBIIndex(data_dir=tmp_path, output_dir=output_dir)
+    # Answered by the first tier
+    assert index.retrieve_top_k("hello", k=1) == ["block1/doc2.txt"]
+    # Falls back to the full postings lists
+    assert index.retrieve_top_k("hello", k=3) == ["block1/doc2.txt", "block1/doc1.txt"]
+    assert index.retrieve_top_k("world", k=2) == ["block1/doc3.txt", "block1/doc1.txt"]
+    assert index.retrieve_top_k("missing", k=2) == []
+
+    # The scores are read once per index
+    (output_dir / "docs.scores").unlink()
+    assert index.retrieve_top_k("python", k=1) == ["block1/doc2.txt"]
+
+    # Reindexing without tiers removes them, also for an index that has them
+    # loaded
+    (temp_block_dir / "doc4.txt").write_text("hello again")
+    BSBIIndex(data_dir=tmp_path, output_dir=output_dir).index()
+    assert not list(output_dir.glob("BSBI.tier1*"))
+    with pytest.raises(ValueError):
+        index.retrieve_top_k("hello", k=2)
+    with pytest.raises(ValueError):
+        BSBIIndex(data_dir=tmp_path, output_dir=output_dir).retrieve_top_k("hello")
+
+
+def test_pair_cache(tmp_path, temp_block_dir, indexed_output_dir):
+    output_dir = indexed_output_dir
+    index = BSBIIndex(data_dir=tmp_path, output_dir=output_dir)
+    expected = {q: index.retrieve(q) for q in ["hello world", "python world of"]}
+    query_log = ["hello world", "world hello", "python world", "world of python"]
+    pair_cache = index.build_pair_cache(query_log, min_count=2)
+    assert pair_cache.pairs == [("hello", "world"), ("python", "world")]
+
+    cached = BSBIIndex(data_dir=tmp_path, output_dir=output_dir)
+    assert cached._get_pair_cache() is not None
+    for query, docs in expected.items():
+        assert cached.retrieve(query) == docs
+
+    # Reindexing rebuilds the cache against the new index
+    (temp_block_dir / "doc4.txt").write_text("hello world again")
+    BSBIIndex(data_dir=tmp_path, output_dir=output_dir).index()
+    reindexed = BSBIIndex(data_dir=tmp_path, output_dir=output_dir)
+    assert reindexed._get_pair_cache() is not None
+    assert reindexed.retrieve("world hello") == ["block1/doc1.txt", "block1/doc4.txt"]
+
+
+def test_index_stats(tmp_path, indexed_output_dir):
+    output_dir = indexed_output_dir
+    index = BSBIIndex(data_dir=tmp_path, output_dir=output_dir)
+    hooked = []
+    index.enable_stats(hook=lambda query, stats: hooked.append((query, stats)))
+    index.retrieve("hello missing")
+    index.retrieve("world")
+
+    first = hooked[0][1]
+    assert hooked[0][0] == "hello missing"
+    assert (first.lookups, first.misses, first.seeks) == (2, 1, 1)
+    assert first.postings_decoded == 2
+    assert index.last_query_stats.postings_decoded == 2
+    assert index.stats.lookups == 3
+    assert index.stats.bytes_read == first.bytes_read * 2
+
+
+@pytest.mark.parametrize(
+    "indexed_output_dir", [{"index_class": SpellingIndex}], indirect=True
+)
+def test_spelling_search(tmp_path, indexed_output_dir):
+    output_dir = indexed_output_dir
+    index = SpellingIndex(data_dir=tmp_path, output_dir=output_dir)
+    index.load_terms()
+
+    lm = index.language_model
+    assert lm.unigram_counts["hello"] == 3
+    assert lm.bigram_counts[("hello", "python")] == 1
+    assert lm.total_num_tokens == 8
+    assert len(lm.unigram_counts) == 4
+    assert dict(lm.bigram_counts.items())[("hello", "world")] == 1
+    assert lm.term_id_map is index.term_id_map
+
+    searcher = SpellingIndex(data_dir=tmp_path, output_dir=output_dir)
+    assert searcher.search("hello python") == ("hello python", ["block1/doc2.txt"])
+    assert searcher.search("helo pyhton") == ("hello python", ["block1/doc2.txt"])
+    assert searcher.search("wrld") == (
+        "world",
+        ["block1/doc1.txt", "block1/doc3.txt"],
+    )
+    # Unknown query terms added to the term map are not candidates
+    assert "helo" in searcher.term_id_map.str_to_id
+    assert "helo" not in searcher.language_model.unigram_counts
+    assert len(searcher.language_model.unigram_counts) == 4
+    assert searcher.search("zzzzzz") == ("zzzzzz", [])
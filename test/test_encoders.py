@@ -1,6 +1,6 @@
 import array
 
-from BSBI.postings import CompressedPostings
+from BSBI.postings import CompressedPostings, HybridPostings, UncompressedPostings
 
 
 def test_encode_number():
@@ -21,3 +21,10 @@ def test_encode_decode():
     e = CompressedPostings.encode(postings)
     d = CompressedPostings.decode(e)
     assert d == postings
+
+
+def test_decode_array():
+    postings = [0, 3, 200, 201, 100_000, 5_000_000]
+    for encoding in (UncompressedPostings, CompressedPostings, HybridPostings):
+        decoded = encoding.decode_array(encoding.encode(postings))
+        assert decoded.tolist() == postings
@@ -1,4 +1,4 @@
-from BSBI.utils import IdMap
+from BSBI.utils import IdMap, MappedIdMap
 
 
 def test_idmap():
@@ -13,3 +13,13 @@ def test_idmap():
     except IndexError as e:
         assert True, "Doesn't throw an IndexError for out of range numeric ids"
     assert len(testIdMap) == 2
+
+
+def test_mapped_idmap(tmp_path):
+    strings = ["0/a.txt", "0/ü.txt", "", "1/b.txt"]
+    MappedIdMap.write(tmp_path / "docs.paths", strings)
+    mapped = MappedIdMap(tmp_path / "docs.paths")
+    assert len(mapped) == len(strings)
+    assert [mapped[i] for i in range(len(strings))] == strings
+    assert mapped[len(strings)] is None
+    mapped.close()
@@ -4,10 +4,23 @@ from pathlib import Path
 
 import pytest
 
+from spelling_corrector.approximate_language_model import ApproximateLanguageModel
 from spelling_corrector.candidate_generator import CandidateGenerator
-from spelling_corrector.edit_probability_model import UniformEditProbabilityModel
+from spelling_corrector.compact_language_model import CompactLanguageModel
+from spelling_corrector.edit_probability_model import (
+    ConfusionMatrixEditProbabilityModel,
+    Edit,
+    UniformEditProbabilityModel,
+    align,
+)
 from spelling_corrector.language_model import LanguageModel
+from spelling_corrector.memoize import (
+    CachedCandidateGenerator,
+    CachedEditProbabilityModel,
+    CachedLanguageModel,
+)
 from spelling_corrector.scorer import CandidateScorer
+from spelling_corrector.stats import CorrectionStats
 
 
 @pytest.fixture
@@ -32,6 +45,20 @@ def edit_probability_model():
     return UniformEditProbabilityModel()
 
 
+@pytest.fixture
+def stanford_corpus_dir(tmp_path):
+    (tmp_path / "doc1.txt").write_text("the stanford university of california " * 5)
+    (tmp_path / "doc2.txt").write_text("stamford universe stanfrod of the california")
+    return tmp_path
+
+
+@pytest.fixture
+def stanford_scorer(stanford_corpus_dir, edit_probability_model) -> CandidateScorer:
+    lm = LanguageModel(corpus_dir=stanford_corpus_dir)
+    cg = CandidateGenerator(lm=lm, epm=edit_probability_model)
+    return CandidateScorer(lm, cg)
+
+
 @pytest.fixture
 def candidate_generator(
     real_language_model, edit_probability_model
@@ -57,6 +84,189 @@ def test_initialization(tmp_corpus_dir: Path):
     assert model.total_num_tokens == 6
 
 
+def test_parallel_initialization(tmp_corpus_dir: Path):
+    (tmp_corpus_dir / "doc3.txt").write_text("bye\nnight  hello\n\nhello bye\n")
+    serial = LanguageModel(corpus_dir=tmp_corpus_dir)
+    parallel = LanguageModel(corpus_dir=tmp_corpus_dir, workers=2)
+
+    assert parallel.unigram_counts == serial.unigram_counts
+    assert parallel.bigram_counts == serial.bigram_counts
+    assert parallel.total_num_tokens == serial.total_num_tokens == 11
+    assert serial.bigram_counts[("bye", "night")] == 1
+
+
+def test_compact_language_model(language_model: LanguageModel, tmp_path: Path):
+    compact = CompactLanguageModel.from_language_model(language_model)
+    compact.save(tmp_path / "lm.bin")
+    loaded = CompactLanguageModel.load(tmp_path / "lm.bin")
+
+    for model in (compact, loaded):
+        assert model.total_num_tokens == language_model.total_num_tokens
+        assert len(model.bigram_counts) == len(language_model.bigram_counts)
+        assert "night" in model.unigram_counts
+        assert "nigth" not in model.unigram_counts
+        for word in language_model.unigram_counts:
+            assert model.vocabulary[model.word_id(word)] == word.encode()
+        for w_1 in language_model.unigram_counts:
+            assert model.get_unigram_logp(w_1) == language_model.get_unigram_logp(w_1)
+            for w_2 in language_model.unigram_counts:
+                assert model.get_bigram_logp(w_1, w_2) == (
+                    language_model.get_bigram_logp(w_1, w_2)
+                )
+
+    with pytest.raises(ValueError):
+        CompactLanguageModel(b"CLM1" + bytes(64))
+
+
+def test_approximate_language_model(language_model: LanguageModel, tmp_corpus_dir):
+    approximate = ApproximateLanguageModel(corpus_dir=tmp_corpus_dir)
+    assert approximate.unigram_counts == language_model.unigram_counts
+    for bigram, count in language_model.bigram_counts.items():
+        assert approximate.bigram_counts[bigram] >= count
+
+    # Sketches counted by different workers are merged into the same counts
+    parallel = ApproximateLanguageModel(corpus_dir=tmp_corpus_dir, workers=2)
+    assert parallel.unigram_counts == approximate.unigram_counts
+    assert parallel.bigram_counts.table == approximate.bigram_counts.table
+    assert parallel.bigram_counts.total == approximate.bigram_counts.total == 4
+
+    queries = ["hello night", "bye hello night", "night bye", "unknown"]
+    agreement = approximate.agreement(language_model, queries)
+    assert agreement["n_queries"] == 3
+    assert agreement["exact_fraction"] == 1.0
+
+    tiny = ApproximateLanguageModel(corpus_dir=tmp_corpus_dir, max_bigram_bytes=64)
+    max_overestimate, failure_probability = tiny.bigram_counts.error_bounds()
+    assert tiny.error_bounds()["bigram_bytes"] <= 64
+    assert failure_probability == pytest.approx(math.exp(-4))
+    for bigram, count in language_model.bigram_counts.items():
+        assert count <= tiny.bigram_counts[bigram] <= count + max_overestimate
+    # Overestimates never make P(w_2 | w_1) exceed 1
+    tiny.lambda_ = 0.0
+    assert tiny.bigram_counts[("bye", "night")] > tiny.unigram_counts["bye"]
+    assert tiny.get_bigram_logp("bye", "night") == 0.0
+
+    pruned = ApproximateLanguageModel(corpus_dir=tmp_corpus_dir, min_bigram_count=2)
+    assert pruned.bigram_counts[("hello", "night")] == 2
+    assert pruned.bigram_counts[("hello", "bye")] == 0
+
+
+def test_candidate_index(tmp_path: Path, edit_probability_model):
+    (tmp_path / "doc.txt").write_text(
+        "stanford standford stanfrod sanford stamford university universe "
+        "unviersity at an a ant and stan_ford hello helo helllo"
+    )
+    lm = LanguageModel(corpus_dir=tmp_path)
+    enumerated = CandidateGenerator(lm=lm, epm=edit_probability_model)
+    indexed = CandidateGenerator(lm=lm, epm=edit_probability_model)
+    indexed.build_candidate_index()
+
+    probes = ["stnford", "unversity", "nt", "stanfords", "hllo", "heo"]
+    for term in list(lm.unigram_counts) + probes:
+        assert sorted(indexed.generate_edit1_ops(term)) == sorted(
+            enumerated.generate_edit1_ops(term)
+        )
+    for query in ["stanfrod universty", "an stamford", "at"]:
+        assert sorted(indexed.get_candidates(query)) == sorted(
+            enumerated.get_candidates(query)
+        )
+
+
+@pytest.mark.parametrize(
+    ["raw", "expected"],
+    [
+        ("stanfrod university", "stanford university"),
+        ("stanford unviersity", "stanford university"),
+        (
+            "the stanfrod unversity of califrnia",
+            "the stanford university of california",
+        ),
+        ("stanford university", "stanford university"),
+        ("stanford xqzwv", "stanford xqzwv"),
+    ],
+)
+def test_lattice_scorer(stanford_scorer: CandidateScorer, raw, expected):
+    assert stanford_scorer.correct_spelling_lattice(raw, max_edits=4) == expected
+
+
+def test_memoized_scoring(language_model: LanguageModel, edit_probability_model):
+    cached_lm = CachedLanguageModel(language_model, maxsize=2)
+    query = "hello night"
+    expected = language_model.get_query_logp(query)
+    assert cached_lm.get_query_logp(query) == expected
+    assert cached_lm.get_query_logp(query) == expected
+    assert cached_lm.cache_stats()["bigram"]["hit_rate"] == 0.5
+
+    cached_lm.get_unigram_logp("bye")
+    cached_lm.get_unigram_logp("night")
+    assert cached_lm.unigram_cache.evictions == 1
+
+    cached_lm.lambda_ = 0.5
+    assert language_model.lambda_ == 0.5
+    assert cached_lm.get_query_logp(query) == language_model.get_query_logp(query)
+    assert cached_lm.get_query_logp(query) != expected
+
+    cached_epm = CachedEditProbabilityModel(edit_probability_model)
+    cg = CachedCandidateGenerator(lm=cached_lm, epm=cached_epm)
+    assert CandidateScorer(cached_lm, cg).correct_spelling("helo nigth") == query
+    assert cg.generate_edit1("helo") == ["hello"]
+    assert cg.cache_stats()["edit1"]["hits"] >= 1
+    cached_epm.get_edit_logp("helo", "hello")
+    assert cached_epm.get_edit_logp("helo", "hello") == math.log(0.05)
+    assert cached_epm.cache.stats()["hits"] == 1
+
+    # Scores depend on the edits, not only on the two strings
+    epm = ConfusionMatrixEditProbabilityModel().fit([("helo", "hello")])
+    cached_epm = CachedEditProbabilityModel(epm)
+    for edits in ([Edit("insert", 1, "e", "el")], [Edit("substitute", 2, "x", "l")]):
+        expected = epm.get_edits_logp("hello", "hxllo", edits)
+        assert cached_epm.get_edits_logp("hello", "hxllo", edits) == expected
+    assert len(cached_epm.cache) == 2
+
+    stats = CorrectionStats()
+    assert CachedCandidateGenerator(cached_lm, cached_epm, stats=stats).stats is stats
+
+
+def test_topk_scorer(stanford_corpus_dir: Path, stanford_scorer: CandidateScorer):
+    scorer, cg = stanford_scorer, stanford_scorer.cg
+
+    raw = "stanfrod universty"
+    candidates = {query for query, _ in cg.get_candidates(raw)}
+    top = scorer.correct_spelling_topk(raw, k=len(candidates) + 1, batch_size=1)
+    assert {query for query, _ in top} == candidates
+    # A candidate yielded twice, also within a batch, takes a single slot
+    queries = [query for query, _ in cg.get_candidates("stamfrod")]
+    assert queries.count("stanford") == 2
+    for batch_size in (1, 1024):
+        stamfrod = scorer.correct_spelling_topk("stamfrod", k=4, batch_size=batch_size)
+        assert sorted(query for query, _ in stamfrod) == sorted(set(queries))
+    assert top[0][0] == scorer.correct_spelling(raw) == "stanford university"
+    assert scorer.correct_spelling_topk(raw, k=1) == top[:1]
+    assert [score for _, score in top] == sorted(
+        (score for _, score in top), reverse=True
+    )
+    for query, score in top:
+        assert math.isclose(score, scorer.get_score(query, math.log(0.05)))
+
+    # Replacing the model rebuilds the compact copy used for batched scoring
+    (stanford_corpus_dir / "doc2.txt").write_text("stanfrod universty")
+    scorer.lm = cg.lm = LanguageModel(corpus_dir=stanford_corpus_dir)
+    assert scorer.correct_spelling_topk(raw, k=1)[0][0] == raw
+
+    scorer.lm = ApproximateLanguageModel(corpus_dir=stanford_corpus_dir)
+    with pytest.raises(TypeError):
+        scorer.correct_spelling_topk(raw)
+
+
+def test_correct_many(stanford_scorer: CandidateScorer):
+    scorer = stanford_scorer
+
+    queries = ["stanfrod universty", "teh university", "stanfrod universty", "of"]
+    expected = [scorer.correct_spelling(raw) for raw in queries]
+    assert scorer.correct_many(queries) == expected
+    assert scorer.correct_many(queries, workers=2, chunksize=1) == expected
+
+
 def test_full_corpus_init(real_language_model: LanguageModel):
     assert len(real_language_model.unigram_counts) == 347071
     assert len(real_language_model.bigram_counts) == 4497257
@@ -123,3 +333,81 @@ def test_scorer(
 ):
     corrected = candidate_scorer.correct_spelling(raw)
     assert corrected == expected
+
+
+def test_edit_operations(tmp_path: Path, language_model: LanguageModel):
+    assert align("stanford", "stanfrod") == [Edit("transpose", 5, "or", "ro")]
+    assert align("hello", "helo") == [Edit("delete", 1, "el", "e")]
+    assert align("night", "nighth") == [Edit("insert", 4, "t", "th")]
+    assert align("bye", "vye") == [Edit("substitute", 0, "b", "v")]
+    assert align("bye", "ye") == [Edit("delete", 0, "b", "")]
+
+    cg = CandidateGenerator(lm=language_model, epm=UniformEditProbabilityModel())
+    for term in ["helo", "hellp", "hlelo", "ehllo", "yhello", "nigh", "bye"]:
+        ops = dict(cg.generate_edit1_ops(term))
+        assert sorted(ops) == sorted(cg.generate_edit1(term))
+        for candidate, op in ops.items():
+            assert align(candidate, term) == [op]
+
+    pairs = tmp_path / "edits.txt"
+    pairs.write_text("helo nigth\thello night\nhelo\thello\nbey\tbye\n")
+    epm = ConfusionMatrixEditProbabilityModel.from_file(pairs)
+    assert epm.edit_counts[("el", "e")] == 2
+    assert epm.char_counts["el"] == 2
+    deletion = epm.get_operation_logp(Edit("delete", 1, "el", "e"))
+    assert deletion > epm.get_operation_logp(Edit("delete", 2, "ll", "l"))
+    assert epm.get_edit_logp("helo", "hello") == deletion
+    assert epm.get_edit_logp("hello", "hello") == math.log(0.95)
+
+    cg = CandidateGenerator(lm=language_model, epm=epm)
+    candidates = dict(cg.get_candidates("helo nigth"))
+    assert candidates["hello night"] == epm.get_edit_logp("helo nigth", "hello night")
+    assert CandidateScorer(language_model, cg).correct_spelling("helo") == "hello"
+
+
+def test_correction_stats(stanford_scorer: CandidateScorer):
+    scorer, cg = stanford_scorer, stanford_scorer.cg
+
+    raw = "stanfrod universty"
+    expected = scorer.correct_spelling(raw)
+    stats = scorer.enable_stats()
+    assert cg.stats is stats
+    assert scorer.correct_spelling(raw) == expected
+
+    n_candidates = len(list(CandidateGenerator(scorer.lm, cg.epm).get_candidates(raw)))
+    assert stats.queries == 1
+    assert stats.generated[0] == 1 and stats.yielded[0] == 0
+    assert sum(stats.yielded.values()) == n_candidates
+    assert sum(stats.generated.values()) >= n_candidates
+    assert 0 < stats.yield_ratios()[2] <= 1
+    assert stats.vocabulary_lookups > 0
+    assert 0 < stats.scoring_time < stats.total_time
+    assert stats.generation_time + stats.filter_time <= stats.candidate_time
+
+    scorer.disable_stats()
+    scorer.correct_spelling(raw)
+    assert cg.stats is None and stats.queries == 1
+
+
+def test_timed_scorer(stanford_scorer: CandidateScorer):
+    scorer = stanford_scorer
+
+    raw = "stanfrod universty"
+    assert scorer.correct_spelling_timed(raw, timeout=60) == (
+        scorer.correct_spelling(raw),
+        True,
+    )
+    # Only the unedited query is generated before the deadline
+    assert scorer.correct_spelling_timed(raw, timeout=0) == (raw, False)
+    assert scorer.correct_spelling_timed("stanford university", timeout=0)[0] == (
+        "stanford university"
+    )
+
+    stats = scorer.enable_stats()
+    confident = scorer.correct_spelling_timed(
+        "stanford university", timeout=60, confidence_logp=-5.0
+    )
+    assert confident == ("stanford university", True)
+    assert sum(stats.generated.values()) == 0
+    scorer.correct_spelling_timed("stanford university", timeout=60)
+    assert stats.generated[0] == 1
@@ -0,0 +1,30 @@
+import fnmatch
+
+import pytest
+
+from BSBI.lexicon import TermLexicon
+from BSBI.utils import IdMap
+
+TERMS = ["computer", "compute", "computing", "commuter", "putter", "co", "cater"]
+
+
+@pytest.fixture
+def lexicon():
+    id_map = IdMap()
+    for term in TERMS:
+        id_map[term]
+    return TermLexicon.from_id_map(id_map)
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    ["comput*", "*ter", "co*ter", "*mput*", "c*", "*o*", "*", "co", "cox", "x*"],
+)
+def test_expand(lexicon, pattern):
+    expected = sorted(term for term in TERMS if fnmatch.fnmatchcase(term, pattern))
+    assert [TERMS[t] for t in lexicon.expand(pattern)] == expected
+
+
+def test_prefix_range(lexicon):
+    start, end = lexicon.prefix_range("comp")
+    assert lexicon.terms[start:end] == ["compute", "computer", "computing"]